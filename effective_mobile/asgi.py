@@ -8,9 +8,19 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import threading
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'effective_mobile.settings')
 
 application = get_asgi_application()
+
+# множество отозванных токенов заполняется при старте воркера, а не первым запросом;
+# в отдельном потоке - сервер (uvicorn) может импортировать приложение внутри цикла событий,
+# где синхронный ORM запрещён
+from myauth.token_store import warm_up_token_store  # noqa: E402
+
+warm_up = threading.Thread(target=warm_up_token_store, name='myauth-warm-up')
+warm_up.start()
+warm_up.join()
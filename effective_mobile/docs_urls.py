@@ -0,0 +1,12 @@
+from django.urls import path, re_path
+
+from myauth.openapi import schema_view, schema_file_view, docs_ui_view
+
+
+# схема собирается командой build_openapi_schema; живая генерация - только в DEBUG без собранной схемы
+urlpatterns = [
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view, name='schema-json'),
+    path('openapi/<str:name>', schema_file_view, name='schema-file'),
+    path('swagger/', docs_ui_view('swagger'), name='schema-swagger-ui'),
+    path('redoc/', docs_ui_view('redoc'), name='schema-redoc'),
+]
@@ -49,6 +49,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # отвечает на /api/auth/verify до остальных middleware
+    'myauth.gateway.GatewayVerifyMiddleware',
+    # число SQL-запросов на представление для /metrics и проверка query_budget
+    'myauth.metrics.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,6 +97,30 @@ DATABASES = {
 }
 
 
+# общий кэш воркеров: версии токенов пользователей, матрица прав, отозванные токены, лента и кэш ответов.
+# Кэш в памяти процесса (LocMemCache) не виден другим воркерам: проверка myauth.E001 требует общий кэш,
+# MYAUTH_SINGLE_PROCESS = True разрешает его для тестов и одного процесса.
+# Без REDIS_URL (тесты, бенчмарки, локальный runserver) используется LocMemCache в режиме одного процесса;
+# для нескольких воркеров REDIS_URL обязателен
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+    MYAUTH_SINGLE_PROCESS = False
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'myauth',
+        }
+    }
+    MYAUTH_SINGLE_PROCESS = True
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -138,6 +166,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'myauth.User'
 
+# проверка пароля в ограниченном пуле хэширования (myauth.hashing)
+AUTHENTICATION_BACKENDS = ['myauth.backends.PasswordPoolBackend']
+
 # настройка собственного класса аутентификации JWT
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -146,8 +177,69 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # JSON через orjson, если он установлен, иначе стандартный json DRF
+    'DEFAULT_RENDERER_CLASSES': (
+        'myauth.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'myauth.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
+# самодостаточные access токены: is_active, is_staff, роли и версия авторизации
+# передаются в токене, пользователь не запрашивается из БД на каждый запрос
+JWT_SELF_CONTAINED_ACCESS_TOKENS = False
+
+# хранилище refresh токенов и отозванных access токенов:
+# 'myauth.token_store.DatabaseTokenStore' - таблицы RefreshToken и BlacklistedToken,
+# 'myauth.token_store.CacheTokenStore' - кэш Django (JWT_TOKEN_STORE_CACHE), TTL = срок жизни токена
+JWT_TOKEN_STORE = 'myauth.token_store.DatabaseTokenStore'
+JWT_TOKEN_STORE_CACHE = 'default'
+# на сколько суток вперёд partition_tokens создаёт секции таблиц токенов (PostgreSQL);
+# должно быть больше срока жизни refresh токена
+JWT_TOKEN_PARTITION_DAYS_AHEAD = 14
+
+# связка ключей подписи JWT: {kid: {'algorithm': ..., 'secret' | 'private_key' / 'public_key': PEM}}
+# поддерживаются HS256 и (с пакетом cryptography) RS256/ES256/EdDSA; токены подписываются
+# ключом JWT_SIGNING_KEY_ID, ключи без private_key только проверяют токены (ротация).
+# Публичные ключи отдаются на /.well-known/jwks.json
+JWT_KEYS = {
+    'default': {'algorithm': 'HS256', 'secret': SECRET_KEY},
+}
+JWT_SIGNING_KEY_ID = 'default'
+# принимать токены без заголовка kid, подписанные HS256 с SECRET_KEY
+JWT_ACCEPT_UNKEYED_TOKENS = True
+JWT_JWKS_MAX_AGE = 300
+
+# окно, в течение которого повторный обмен того же refresh токена возвращает ту же новую пару
+JWT_REFRESH_ROTATION_GRACE_SECONDS = 10
+
+# метрики Prometheus на /metrics (нужен пакет prometheus-client); для gunicorn с несколькими
+# воркерами задайте переменную окружения PROMETHEUS_MULTIPROC_DIR
+METRICS_ENABLED = True
+# токен скрейпера Prometheus (Authorization: Bearer ...); без него /metrics отвечает 403
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# превышение query_budget представления: предупреждение в логе myauth.query_budget с отпечатками SQL;
+# строгий режим (исключение) включается только в тестах через override_settings - в обработке
+# запроса исключение бросается уже после коммита записей представления
+QUERY_BUDGET_STRICT = False
+
+# кэш данных ответов профиля и ленты: алиас из CACHES и время свежести записи в секундах
+# (устаревшая запись ещё RESPONSE_CACHE_STALE_TIMEOUT секунд отдаётся, пока один воркер её пересобирает)
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 60
+RESPONSE_CACHE_STALE_TIMEOUT = 30
+
+# максимальное число токенов в одном запросе /api/auth/token/introspect/
+JWT_INTROSPECTION_MAX_TOKENS = 1000
+
+
+# каталог схемы OpenAPI, собранной командой build_openapi_schema
+OPENAPI_SCHEMA_DIR = BASE_DIR / 'build' / 'openapi'
 
 # настройки Swagger UI
 SWAGGER_SETTINGS = {
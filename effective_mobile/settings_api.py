@@ -0,0 +1,64 @@
+"""
+Настройки API-режима: DJANGO_SETTINGS_MODULE=effective_mobile.settings_api.
+
+Трафик API аутентифицируется JWT, поэтому сессии, CSRF, messages, админка, статика
+и шаблоны ему не нужны. Профиль убирает их из INSTALLED_APPS и MIDDLEWARE, а drf_yasg
+(Swagger, ReDoc) подключает только при API_DOCS_ENABLED=true. Это сокращает время
+загрузки воркера и работу middleware на каждый запрос.
+"""
+
+import os
+
+from effective_mobile.settings import *  # noqa: F401,F403
+from effective_mobile.settings import REST_FRAMEWORK, SWAGGER_SETTINGS
+
+
+API_DOCS_ENABLED = os.getenv('API_DOCS_ENABLED', 'false').lower() == 'true'
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+
+    'rest_framework',
+
+    'myauth.apps.MyauthConfig',
+]
+
+MIDDLEWARE = [
+    'myauth.gateway.GatewayVerifyMiddleware',
+    'myauth.metrics.QueryCountMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'effective_mobile.urls_api'
+
+# шаблоны нужны только страницам Swagger и ReDoc
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': (
+        'myauth.renderers.FastJSONRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'myauth.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+    ),
+}
+
+if API_DOCS_ENABLED:
+    INSTALLED_APPS += ['django.contrib.staticfiles', 'drf_yasg']
+    TEMPLATES = [
+        {
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'APP_DIRS': True,
+            'OPTIONS': {
+                'context_processors': [
+                    'django.template.context_processors.request',
+                ],
+            },
+        },
+    ]
+    # без сессий вход в Swagger UI возможен только по токену
+    SWAGGER_SETTINGS = {**SWAGGER_SETTINGS, 'USE_SESSION_AUTH': False}
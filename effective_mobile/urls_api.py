@@ -0,0 +1,16 @@
+from django.urls import path, include
+
+from myauth.api_docs import API_DOCS_ENABLED
+from myauth.views import jwks_view
+from myauth.metrics import metrics_view
+
+
+# URLconf API-режима (settings_api): без админки, Swagger и ReDoc - только при API_DOCS_ENABLED
+urlpatterns = [
+    path('api/auth/', include('myauth.urls')),
+    path('.well-known/jwks.json', jwks_view, name='jwks'),
+    path('metrics', metrics_view, name='metrics'),
+]
+
+if API_DOCS_ENABLED:
+    urlpatterns.append(path('', include('effective_mobile.docs_urls')))
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'effective_mobile.settings')
 
 application = get_wsgi_application()
+
+# множество отозванных токенов заполняется при старте воркера, а не первым запросом
+from myauth.token_store import warm_up_token_store  # noqa: E402
+
+warm_up_token_store()
@@ -0,0 +1,12 @@
+from django.conf import settings
+
+API_DOCS_ENABLED = 'drf_yasg' in settings.INSTALLED_APPS
+
+if API_DOCS_ENABLED:
+    from drf_yasg.utils import swagger_auto_schema
+else:
+    def swagger_auto_schema(*args, **kwargs):
+        """Без drf_yasg (API-режим без документации) декоратор не меняет представление и не импортирует drf_yasg"""
+        def decorator(view_func):
+            return view_func
+        return decorator
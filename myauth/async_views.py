@@ -0,0 +1,144 @@
+import datetime
+import io
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status, exceptions
+
+from myauth.authentication import JWTAuthentication
+from myauth.hashing import PasswordHashingBusy
+from myauth.renderers import FastJSONRenderer, FastJSONParser
+from myauth.serializers import LoginSerializer
+from myauth.jwt_utils import (
+    acreate_jwt_tokens,
+    decode_jwt_token,
+    ablacklist_token,
+    aaccess_token_claims,
+    arotate_refresh_token,
+    bump_token_version,
+    revoke_token_family,
+    token_family,
+    RefreshTokenError
+)
+from myauth.utils import token_digest
+from myauth.token_store import get_token_store
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(FastJSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def parse_json(request):
+    """Разбирает JSON-тело запроса, при ошибке возвращает пустой словарь"""
+    try:
+        data = FastJSONParser().parse(io.BytesIO(request.body or b'{}'))
+    except exceptions.ParseError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+class AsyncLoginView(View):
+    """Асинхронное представление для аутентификации пользователей и выдачи JWT-токена (ASGI)"""
+    async def post(self, request):
+        serializer = LoginSerializer(data=parse_json(request))
+
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        email = serializer.validated_data['email']
+        password = serializer.validated_data['password']
+
+        try:
+            user = await aauthenticate(request, email=email, password=password)
+        except PasswordHashingBusy as exc:
+            response = json_response({'detail': exc.detail}, status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(exc.wait)
+            return response
+
+        if user is not None:
+            token = await acreate_jwt_tokens(user.id, await aaccess_token_claims(user.id), user.token_version)
+            return json_response({"token": token})
+        return json_response(
+            {"error": "Неверные данные пользователя или пользователь удален!"},
+            status.HTTP_401_UNAUTHORIZED
+        )
+
+
+class AsyncRefreshTokenView(View):
+    """Асинхронное представление для обмена refresh токена на новую пару токенов (ASGI)"""
+    async def post(self, request):
+        refresh_token = parse_json(request).get('refresh_token')
+        if not refresh_token:
+            return json_response({"error": "refresh-token обязателен!"}, status.HTTP_400_BAD_REQUEST)
+
+        payload = decode_jwt_token(refresh_token)
+        if not payload or payload.get('type') != 'refresh':
+            return json_response({'error': 'Недействительный refresh_token!'}, status.HTTP_401_UNAUTHORIZED)
+
+        try:
+            tokens = await arotate_refresh_token(refresh_token, payload)
+        except RefreshTokenError as exc:
+            return json_response({'error': str(exc)}, status.HTTP_401_UNAUTHORIZED)
+
+        return json_response(tokens)
+
+
+class AsyncLogoutView(View):
+    """Асинхронное представление для logout пользователей (ASGI)"""
+    async def post(self, request):
+        try:
+            auth = await JWTAuthentication().aauthenticate(request)
+        except exceptions.AuthenticationFailed as exc:
+            return json_response({'detail': exc.detail}, status.HTTP_401_UNAUTHORIZED)
+
+        if auth is None:
+            return json_response(
+                {'detail': 'Учетные данные не были предоставлены.'},
+                status.HTTP_401_UNAUTHORIZED
+            )
+        user, access_token = auth
+
+        refresh_token = parse_json(request).get('refresh_token')
+        if not refresh_token:
+            return json_response({'error': 'refresh_token отсутствует!'}, status.HTTP_400_BAD_REQUEST)
+
+        payload = decode_jwt_token(refresh_token)
+        if not payload or payload.get('type') != 'refresh':
+            return json_response({'error': 'Неверный refresh_token!'}, status.HTTP_401_UNAUTHORIZED)
+
+        deleted = await get_token_store().adiscard(token_digest(refresh_token))
+
+        if not deleted:
+            await sync_to_async(revoke_token_family)(payload['user_id'], token_family(payload))
+            return json_response({'error': 'refresh_token уже отозван или не найден!'})
+
+        access_payload = decode_jwt_token(access_token)
+        if not access_payload:
+            return json_response({'error': 'Неверный access_token'}, status.HTTP_401_UNAUTHORIZED)
+
+        expired_at = datetime.datetime.fromtimestamp(access_payload['exp'], tz=datetime.timezone.utc)
+
+        await ablacklist_token(user.id, access_token, expired_at)
+
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncLogoutAllView(View):
+    """Асинхронное представление для выхода на всех устройствах (ASGI)"""
+    async def post(self, request):
+        try:
+            auth = await JWTAuthentication().aauthenticate(request)
+        except exceptions.AuthenticationFailed as exc:
+            return json_response({'detail': exc.detail}, status.HTTP_401_UNAUTHORIZED)
+
+        if auth is None:
+            return json_response(
+                {'detail': 'Учетные данные не были предоставлены.'},
+                status.HTTP_401_UNAUTHORIZED
+            )
+        user, _ = auth
+
+        await sync_to_async(bump_token_version)(user.id)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
@@ -1,40 +1,156 @@
 import jwt
 
-from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
 from rest_framework import authentication, exceptions
+from myauth.metrics import StageTimer
 from myauth.models import User
-from myauth.jwt_utils import is_token_blacklisted
+from myauth.jwt_utils import (
+    is_token_blacklisted,
+    ais_token_blacklisted,
+    get_user_versions,
+    aget_user_versions,
+    verify_jwt_token
+)
+
+
+class LazyTokenUser(SimpleLazyObject):
+    """Пользователь, восстановленный из claims самодостаточного access токена.
+
+    id, is_active, is_staff и роли берутся из токена; запрос к БД выполняется
+    только при обращении к остальным полям модели.
+    """
+    def __init__(self, payload):
+        user_id = payload['user_id']
+        super().__init__(lambda: User.objects.get(id=user_id))
+        self.__dict__['_claims'] = {
+            'id': user_id,
+            'pk': user_id,
+            'is_active': payload['is_active'],
+            'is_staff': payload['is_staff'],
+            'token_role_ids': payload['roles'],
+            'is_authenticated': True,
+            'is_anonymous': False,
+        }
+
+    def __getattr__(self, name):
+        claims = self.__dict__['_claims']
+        if self._wrapped is empty and name in claims:
+            return claims[name]
+        return super().__getattr__(name)
+
+    def __bool__(self):
+        return True
+
 
 class JWTAuthentication(authentication.BaseAuthentication):
-    """Кастомный класс аутентификации на основе JWT для Django REST Framework"""
-    def authenticate(self, request):
+    """Кастомный класс аутентификации на основе JWT для Django REST Framework.
+
+    aauthenticate() - асинхронный вариант для ASGI-представлений вне DRF.
+    """
+    def get_token(self, request):
+        """Извлекает токен из заголовка Authorization: Bearer <token>"""
         auth_header = authentication.get_authorization_header(request).decode('utf-8')
 
         if not auth_header or not auth_header.startswith('Bearer '):
             return None
 
-        token = auth_header.split(' ')[1]
+        return auth_header.split(' ')[1]
 
-        if is_token_blacklisted(token):
-            raise exceptions.AuthenticationFailed("Токен заблокирован (logout)")
+    def get_payload(self, token):
+        """Проверяет подпись токена, его тип и наличие user_id.
 
+        Принимаются только access токены: долгоживущий refresh токен
+        не должен работать как учётные данные запроса.
+        """
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload = verify_jwt_token(token)
         except jwt.ExpiredSignatureError:
             raise exceptions.AuthenticationFailed('Токен просрочен')
         except jwt.InvalidTokenError:
             raise exceptions.AuthenticationFailed('Неверный токен')
 
-        user_id = payload.get('user_id')
-        if not user_id:
+        if payload.get('type') != 'access':
+            raise exceptions.AuthenticationFailed('Неверный токен: ожидается access токен')
+
+        if not payload.get('user_id'):
             raise exceptions.AuthenticationFailed('Неверный токен: отсутствует user_id')
 
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
+        return payload
+
+    def check_user(self, user):
+        if user is None:
             raise exceptions.AuthenticationFailed('Пользователь не найден')
 
         if not user.is_active:
             raise exceptions.AuthenticationFailed('Пользователь неактивен')
 
+        return user
+
+    def check_token_version(self, payload, token_version):
+        """Отклоняет токены, выданные до последнего "выхода на всех устройствах" """
+        if payload.get('tv', 0) != token_version:
+            raise exceptions.AuthenticationFailed('Токен отозван')
+
+    def check_self_contained(self, payload, versions):
+        """Проверяет самодостаточный токен по версиям пользователя без запроса пользователя.
+
+        Версии берутся из общего кэша, а без него - из БД (get_user_versions()), поэтому
+        отзыв роли или удаление пользователя на одном воркере сразу видны на остальных.
+        """
+        if versions is None:
+            raise exceptions.AuthenticationFailed('Пользователь не найден')
+
+        auth_version, token_version = versions
+        self.check_token_version(payload, token_version)
+
+        if auth_version != payload['ver']:
+            raise exceptions.AuthenticationFailed('Токен устарел')
+
+        return self.check_user(LazyTokenUser(payload))
+
+    def authenticate(self, request):
+        timer = StageTimer()
+        token = self.get_token(request)
+        timer.mark('header')
+        if token is None:
+            return None
+
+        payload = self.get_payload(token)
+        user_id = payload['user_id']
+        timer.mark('decode')
+
+        if is_token_blacklisted(token, payload):
+            raise exceptions.AuthenticationFailed("Токен заблокирован (logout)")
+        timer.mark('blacklist')
+
+        if 'ver' in payload:
+            user = self.check_self_contained(payload, get_user_versions(user_id))
+        else:
+            user = self.check_user(User.objects.filter(id=user_id).first())
+            self.check_token_version(payload, user.token_version)
+        timer.mark('user')
+        return user, token
+
+    async def aauthenticate(self, request):
+        """Асинхронная версия authenticate() на async ORM"""
+        timer = StageTimer()
+        token = self.get_token(request)
+        timer.mark('header')
+        if token is None:
+            return None
+
+        payload = self.get_payload(token)
+        user_id = payload['user_id']
+        timer.mark('decode')
+
+        if await ais_token_blacklisted(token, payload):
+            raise exceptions.AuthenticationFailed("Токен заблокирован (logout)")
+        timer.mark('blacklist')
+
+        if 'ver' in payload:
+            user = self.check_self_contained(payload, await aget_user_versions(user_id))
+        else:
+            user = self.check_user(await User.objects.filter(id=user_id).afirst())
+            self.check_token_version(payload, user.token_version)
+        timer.mark('user')
         return user, token
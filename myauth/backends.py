@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from myauth.hashing import verify_password, acheck_password
+
+UserModel = get_user_model()
+
+
+class PasswordPoolBackend(ModelBackend):
+    """ModelBackend, проверяющий пароль в пуле хэширования (myauth.hashing).
+
+    Пользователь ищется и хэш обновляется в потоке запроса (в его соединении с БД),
+    в пул уходит только check_password/make_password. Заполненная очередь пула
+    поднимает PasswordHashingBusy (429).
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            verify_password(password, None)
+            return None
+
+        valid, upgraded = verify_password(password, user.password)
+        if valid and upgraded:
+            user.password = upgraded
+            user.save(update_fields=['password'])
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            await acheck_password(password, None)
+            return None
+
+        valid, upgraded = await acheck_password(password, user.password)
+        if valid and upgraded:
+            user.password = upgraded
+            await user.asave(update_fields=['password'])
+        if valid and self.user_can_authenticate(user):
+            return user
+        return None
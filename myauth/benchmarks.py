@@ -0,0 +1,263 @@
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+from django.db import connection
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from myauth.authentication import JWTAuthentication
+from myauth.feed import FEED_PAGE_SIZE
+from myauth.jwt_utils import create_jwt_tokens, decode_jwt_token, is_token_blacklisted, access_token_claims
+from myauth.models import Post
+from myauth.renderers import FastJSONRenderer, FastJSONParser
+from myauth.serializers import UserSerializer, PostSerializer
+from myauth.utils import has_permission
+
+# сценарий одной сессии нагрузочного теста: (имя, метод, путь); login и logout - в начале и в конце
+SESSION_SCENARIO = (
+    ('profile', 'GET', '/api/auth/user/'),
+    ('feed', 'GET', '/api/auth/feed/'),
+    ('feed', 'GET', '/api/auth/feed/'),
+    ('profile', 'GET', '/api/auth/user/'),
+    ('feed', 'GET', '/api/auth/feed/'),
+    ('refresh', 'POST', '/api/auth/token/refresh/'),
+    ('feed', 'GET', '/api/auth/feed/'),
+    ('profile', 'GET', '/api/auth/user/'),
+)
+
+
+def percentile(samples, percent):
+    samples = sorted(samples)
+    index = min(int(len(samples) * percent / 100), len(samples) - 1)
+    return samples[index]
+
+
+def summarize(samples, errors=0):
+    """Сводка по замерам в секундах: перцентили и среднее в миллисекундах, операций в секунду"""
+    return {
+        'count': len(samples),
+        'errors': errors,
+        'p50_ms': percentile(samples, 50) * 1000 if samples else None,
+        'p90_ms': percentile(samples, 90) * 1000 if samples else None,
+        'p99_ms': percentile(samples, 99) * 1000 if samples else None,
+        'mean_ms': statistics.fmean(samples) * 1000 if samples else None,
+        'ops_per_sec': len(samples) / sum(samples) if samples else None,
+    }
+
+
+def measure(func, iterations, warmup):
+    """Вызывает func warmup раз без замера, затем iterations раз с замером каждого вызова"""
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run_micro_benchmarks(user, iterations, warmup):
+    """Микро-бенчмарки горячих функций на прогретых кэшах. Возвращает {имя: сводка}"""
+    tokens = create_jwt_tokens(user.id, access_token_claims(user.id))
+    access_token = tokens['access_token']
+    access_payload = decode_jwt_token(access_token)
+    request = RequestFactory().get('/api/auth/user/', HTTP_AUTHORIZATION=f'Bearer {access_token}')
+    authenticator = JWTAuthentication()
+
+    benchmarks = {
+        'create_jwt_tokens': lambda: create_jwt_tokens(user.id, access_token_claims(user.id)),
+        'decode_jwt_token': lambda: decode_jwt_token(access_token),
+        'is_token_blacklisted': lambda: is_token_blacklisted(access_token, access_payload),
+        'has_permission': lambda: has_permission(user, 'NewsFeed', 'read'),
+        'authenticate': lambda: authenticator.authenticate(request),
+    }
+    return {
+        f'micro.{name}': summarize(measure(func, iterations, warmup))
+        for name, func in benchmarks.items()
+    }
+
+
+def json_payloads(user):
+    """Типичные тела ответов и запросов эндпоинтов: ({эндпоинт: ответ}, {эндпоинт: тело запроса})"""
+    tokens = create_jwt_tokens(user.id, access_token_claims(user.id))
+    now = timezone.now()
+    posts = [
+        Post(id=number, title=f'Новость {number}', content='Текст новости ' * 20, created_at=now)
+        for number in range(FEED_PAGE_SIZE, 0, -1)
+    ]
+    responses = {
+        'login': {'token': tokens},
+        'refresh': tokens,
+        'profile': UserSerializer(user).data,
+        'feed': {'news': PostSerializer(posts, many=True).data, 'next_cursor': 'MjAyNi0wMS0wMVQwMDowMDowMHwx'},
+        'error': {'error': 'Нет прав на чтение новостей!'},
+    }
+    requests = {
+        'login': {'email': user.email, 'password': 'userpassword'},
+        'refresh': {'refresh_token': tokens['refresh_token']},
+        'profile': {'first_name': 'Илья', 'last_name': 'Третьяк'},
+    }
+    return responses, requests
+
+
+def run_json_benchmarks(user, iterations, warmup):
+    """Стоимость сериализации ответа и разбора тела запроса по эндпоинтам:
+    стандартные JSONRenderer/JSONParser DRF против FastJSONRenderer/FastJSONParser"""
+    responses, requests = json_payloads(user)
+    renderers = {'stdlib': JSONRenderer(), 'fast': FastJSONRenderer()}
+    parsers = {'stdlib': JSONParser(), 'fast': FastJSONParser()}
+
+    results = {}
+    for endpoint, data in responses.items():
+        for name, renderer in renderers.items():
+            samples = measure(lambda: renderer.render(data), iterations, warmup)
+            results[f'json.render.{endpoint}.{name}'] = summarize(samples)
+    for endpoint, data in requests.items():
+        body = JSONRenderer().render(data)
+        for name, parser in parsers.items():
+            samples = measure(lambda: parser.parse(io.BytesIO(body)), iterations, warmup)
+            results[f'json.parse.{endpoint}.{name}'] = summarize(samples)
+    return results
+
+
+class LoadDriver:
+    """Нагрузочный тест по HTTP: concurrency потоков выполняют sessions сессий SESSION_SCENARIO.
+
+    Каждая сессия входит под email/password, выполняет сценарий и выходит;
+    замеры и ошибки (статус не 2xx/3xx или сетевая ошибка) собираются по шагам.
+    """
+    def __init__(self, base_url, email, password, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)
+        self._errors = defaultdict(int)
+
+    def request(self, name, method, path, data=None, token=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        http_request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        http_request.add_header('Content-Type', 'application/json')
+        if token:
+            http_request.add_header('Authorization', f'Bearer {token}')
+
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+                payload = response.read()
+            ok = True
+        except (urllib.error.URLError, OSError):
+            payload = None
+            ok = False
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            if ok:
+                self._samples[name].append(elapsed)
+            else:
+                self._errors[name] += 1
+        return json.loads(payload) if ok and payload else None
+
+    def session(self):
+        login = self.request('login', 'POST', '/api/auth/login/', {'email': self.email, 'password': self.password})
+        if not login:
+            return
+        tokens = login['token']
+
+        for name, method, path in SESSION_SCENARIO:
+            if name == 'refresh':
+                refreshed = self.request(name, method, path, {'refresh_token': tokens['refresh_token']})
+                if refreshed:
+                    tokens = refreshed
+                continue
+            self.request(name, method, path, token=tokens['access_token'])
+
+        self.request('logout', 'POST', '/api/auth/logout/', {'refresh_token': tokens['refresh_token']},
+                     token=tokens['access_token'])
+
+    def run(self, sessions, concurrency):
+        """Выполняет сессии и возвращает {имя: сводка} по шагам и общее время"""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(self.session) for _ in range(sessions)]:
+                future.result()
+        wall_time = time.perf_counter() - started
+
+        names = set(self._samples) | set(self._errors)
+        results = {f'load.{name}': summarize(self._samples[name], self._errors[name]) for name in sorted(names)}
+        total = sum(len(samples) for samples in self._samples.values())
+        results['load.total'] = {
+            'count': total,
+            'errors': sum(self._errors.values()),
+            'wall_time_s': wall_time,
+            'requests_per_sec': total / wall_time if wall_time else None,
+        }
+        return results
+
+
+def measure_startup(settings_module, runs, requests, path):
+    """Холодный старт воркера с профилем settings_module: runs запусков myauth.startup_probe
+    в отдельных процессах. Возвращает медианы замеров, process_s - от запуска интерпретатора"""
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    command = [sys.executable, '-m', 'myauth.startup_probe', '--requests', str(requests), '--path', path]
+
+    probes = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run(command, env=env, capture_output=True, check=True, text=True).stdout
+        probe = json.loads(output)
+        probe['process_s'] = time.perf_counter() - started
+        probes.append(probe)
+
+    return {
+        key: statistics.median(probe[key] for probe in probes) if key != 'status' else probes[0][key]
+        for key in probes[0]
+    }
+
+
+def environment():
+    """Описание окружения прогона для сравнения результатов"""
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def compare(results, baseline, threshold, metric='p50_ms'):
+    """Сравнивает прогон с базовым по метрике metric.
+
+    Возвращает список регрессий (имя, базовое значение, текущее значение, относительный рост),
+    превысивших threshold (0.2 = на 20% медленнее).
+    """
+    regressions = []
+    for name, summary in results.items():
+        base_value = baseline.get(name, {}).get(metric)
+        value = summary.get(metric)
+        if not base_value or value is None:
+            continue
+        change = value / base_value - 1
+        if change > threshold:
+            regressions.append((name, base_value, value, change))
+    return regressions
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+from myauth.shared_cache import is_shared_cache
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Общий кэш обязателен: без него отзыв токенов и прав доходит до других воркеров только через БД"""
+    aliases = {'default', getattr(settings, 'JWT_TOKEN_STORE_CACHE', 'default')}
+    return [
+        Error(
+            f'Кэш "{alias}" хранится в памяти процесса и не виден другим воркерам.',
+            hint='Настройте CACHES на Redis или Memcached (REDIS_URL); для тестов и одного процесса '
+                 'задайте MYAUTH_SINGLE_PROCESS = True.',
+            id='myauth.E001',
+        )
+        for alias in sorted(aliases)
+        if not is_shared_cache(alias)
+    ]
+
+
+@register(Tags.caches)
+def check_self_contained_tokens(app_configs, **kwargs):
+    """Самодостаточные токены без общего кэша проверяют auth_version запросом к БД"""
+    if not getattr(settings, 'JWT_SELF_CONTAINED_ACCESS_TOKENS', False) or is_shared_cache():
+        return []
+    return [
+        Warning(
+            'JWT_SELF_CONTAINED_ACCESS_TOKENS без общего кэша: версия авторизации пользователя '
+            'читается из БД на каждый запрос.',
+            hint='Настройте CACHES на Redis или Memcached, чтобы отзыв ролей и удаление '
+                 'пользователя проверялись по общему кэшу.',
+            id='myauth.W002',
+        )
+    ]
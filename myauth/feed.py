@@ -0,0 +1,90 @@
+import base64
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from myauth.models import Post
+from myauth.shared_cache import is_shared_cache
+
+FEED_STATE_CACHE_KEY = 'myauth:feed:state'
+FEED_STATE_TIMEOUT = getattr(settings, 'FEED_STATE_TIMEOUT', 24 * 60 * 60)
+FEED_PAGE_SIZE = getattr(settings, 'FEED_PAGE_SIZE', 20)
+FEED_MAX_PAGE_SIZE = getattr(settings, 'FEED_MAX_PAGE_SIZE', 100)
+
+
+class InvalidCursor(ValueError):
+    """Курсор пагинации повреждён или подделан"""
+
+
+def encode_cursor(created_at, post_id):
+    raw = f'{created_at.isoformat()}|{post_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (created_at, id) последнего поста предыдущей страницы"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, post_id = raw.split('|')
+        created_at = parse_datetime(created_at)
+        post_id = int(post_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    if created_at is None:
+        raise InvalidCursor(cursor)
+    return created_at, post_id
+
+
+def get_page(cursor=None, limit=FEED_PAGE_SIZE):
+    """Страница ленты по убыванию (created_at, id) и курсор следующей страницы.
+
+    Условие по курсору идёт по индексу myauth_post_feed_idx, поэтому время ответа
+    не зависит от номера страницы (в отличие от OFFSET).
+    """
+    posts = Post.objects.order_by('-created_at', '-id')
+    if cursor:
+        created_at, post_id = decode_cursor(cursor)
+        posts = posts.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=post_id))
+
+    page = list(posts[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1].created_at, page[limit - 1].id) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+def _db_feed_state():
+    """Версия ленты из самой таблицы постов: меняется при вставке, изменении и удалении"""
+    state = Post.objects.aggregate(last_modified=Max('updated_at'), count=Count('id'), last_id=Max('id'))
+    raw = f"{state['last_modified'] and state['last_modified'].isoformat()}|{state['count']}|{state['last_id']}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def get_feed_state():
+    """Возвращает (версия, время последнего изменения) ленты из общего кэша.
+
+    Версия меняется при каждом изменении постов (bump_feed_version); при промахе кэша
+    выбирается новая версия и текущее время, так что старые ETag перестают совпадать,
+    а Last-Modified не уходит назад (после удаления поста Max('updated_at') меньше
+    уже отданного значения).
+
+    Без общего кэша версия вычисляется из таблицы постов на каждый запрос, а время
+    изменения не отдаётся (None): без общего состояния его нельзя сделать монотонным.
+    """
+    if not is_shared_cache():
+        return _db_feed_state(), None
+
+    state = cache.get(FEED_STATE_CACHE_KEY)
+    if state is None:
+        state = (uuid.uuid4().hex, timezone.now())
+        if not cache.add(FEED_STATE_CACHE_KEY, state, timeout=FEED_STATE_TIMEOUT):
+            state = cache.get(FEED_STATE_CACHE_KEY) or state
+    return state
+
+
+def bump_feed_version():
+    """Отмечает изменение ленты: новая версия для ETag и новое время для Last-Modified"""
+    cache.set(FEED_STATE_CACHE_KEY, (uuid.uuid4().hex, timezone.now()), timeout=FEED_STATE_TIMEOUT)
@@ -0,0 +1,93 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import exceptions
+
+from myauth.authentication import JWTAuthentication
+from myauth.permission_matrix import permission_matrix
+
+VERIFY_PATH = getattr(settings, 'JWT_GATEWAY_VERIFY_PATH', '/api/auth/verify')
+
+authenticator = JWTAuthentication()
+
+
+def unauthorized():
+    response = HttpResponse(status=401)
+    response['WWW-Authenticate'] = 'Bearer'
+    return response
+
+
+def _user_roles(user):
+    """Имена ролей из самодостаточного токена или из кэша матрицы прав"""
+    role_ids = getattr(user, 'token_role_ids', None)
+    if role_ids is None:
+        role_ids = permission_matrix.get_user_roles(user.id)
+    return permission_matrix.role_names(role_ids)
+
+
+def verified(user, role_names):
+    response = HttpResponse(status=200)
+    response['X-User-Id'] = str(user.id)
+    response['X-Roles'] = ','.join(role_names)
+    return response
+
+
+def verify_view(request):
+    """Проверка токена для auth_request-подзапросов nginx/envoy.
+
+    Без DRF, сериализаторов и тела ответа: 200 с заголовками X-User-Id и X-Roles
+    или 401. Роли берутся из самодостаточного токена или из кэша матрицы прав.
+    """
+    try:
+        auth = authenticator.authenticate(request)
+    except exceptions.AuthenticationFailed:
+        return unauthorized()
+
+    if auth is None:
+        return unauthorized()
+
+    user, _ = auth
+    return verified(user, _user_roles(user))
+
+
+async def averify_view(request):
+    """Асинхронная версия verify_view() для ASGI"""
+    try:
+        auth = await authenticator.aauthenticate(request)
+    except exceptions.AuthenticationFailed:
+        return unauthorized()
+
+    if auth is None:
+        return unauthorized()
+
+    user, _ = auth
+    return verified(user, await sync_to_async(_user_roles)(user))
+
+
+class GatewayVerifyMiddleware:
+    """Отвечает на VERIFY_PATH до остальных middleware и разрешения URL.
+
+    Должен стоять в начале MIDDLEWARE: сессии, CSRF, messages и т.п.
+    для подзапросов проверки токена не выполняются. Работает и под WSGI,
+    и под ASGI без переключения в поток.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.path_info == VERIFY_PATH:
+            return verify_view(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path_info == VERIFY_PATH:
+            return await averify_view(request)
+        return await self.get_response(request)
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework import exceptions
+
+from myauth.metrics import (
+    observe_seconds,
+    PASSWORD_VERIFY_SECONDS,
+    PASSWORD_POOL_QUEUE_DEPTH,
+    PASSWORD_POOL_RUNNING,
+    PASSWORD_POOL_WAIT_SECONDS,
+    PASSWORD_POOL_REJECTED
+)
+
+PASSWORD_HASHING_WORKERS = getattr(settings, 'PASSWORD_HASHING_WORKERS', 4)
+PASSWORD_HASHING_QUEUE_SIZE = getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 16)
+PASSWORD_HASHING_RETRY_AFTER = getattr(settings, 'PASSWORD_HASHING_RETRY_AFTER', 1)
+
+
+class PasswordHashingBusy(exceptions.Throttled):
+    """Очередь пула хэширования паролей заполнена (429 + Retry-After)"""
+    default_detail = 'Сервер перегружен, повторите попытку позже.'
+
+
+class PasswordHashingPool:
+    """Ограниченный пул потоков для проверки и вычисления хэшей паролей.
+
+    Одновременно выполняется не больше workers задач, ещё queue_size ждут в очереди;
+    при заполненной очереди задача сразу отклоняется с PasswordHashingBusy.
+    Хэширование тем самым изолировано от остальных потоков воркера.
+    Глубина очереди, число выполняемых задач, время ожидания и отказы
+    публикуются в метриках myauth_password_pool_* (см. myauth.metrics).
+    """
+    def __init__(self, workers=PASSWORD_HASHING_WORKERS, queue_size=PASSWORD_HASHING_QUEUE_SIZE,
+                 retry_after=PASSWORD_HASHING_RETRY_AFTER):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='myauth-password')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, func, *args):
+        """Ставит задачу в пул и возвращает concurrent.futures.Future"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            PASSWORD_POOL_REJECTED.inc()
+            raise PasswordHashingBusy(wait=self.retry_after)
+
+        with self._lock:
+            self._in_flight += 1
+        PASSWORD_POOL_QUEUE_DEPTH.inc()
+        try:
+            return self._executor.submit(self._run, time.monotonic(), func, *args)
+        except BaseException:
+            PASSWORD_POOL_QUEUE_DEPTH.dec()
+            self._release()
+            raise
+
+    def _run(self, submitted_at, func, *args):
+        wait = time.monotonic() - submitted_at
+        with self._lock:
+            self._running += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+        PASSWORD_POOL_QUEUE_DEPTH.dec()
+        PASSWORD_POOL_RUNNING.inc()
+        PASSWORD_POOL_WAIT_SECONDS.observe(wait)
+        try:
+            return func(*args)
+        finally:
+            PASSWORD_POOL_RUNNING.dec()
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def run(self, func, *args):
+        """Выполняет задачу в пуле и ждёт результат"""
+        return self.submit(func, *args).result()
+
+    async def arun(self, func, *args):
+        """Выполняет задачу в пуле, не блокируя цикл событий"""
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def stats(self):
+        """Возвращает глубину очереди, счётчики и время ожидания в очереди"""
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queue_depth': self._in_flight - self._running,
+                'running': self._running,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'avg_wait_ms': self._wait_total / started * 1000 if started else 0.0,
+                'max_wait_ms': self._wait_max * 1000,
+            }
+
+
+password_pool = PasswordHashingPool()
+
+
+@observe_seconds(PASSWORD_VERIFY_SECONDS)
+def verify_password(password, encoded):
+    """Проверяет пароль в пуле хэширования.
+
+    Если encoded равен None (пользователь не найден), всё равно вычисляет хэш,
+    чтобы время ответа не выдавало существование email.
+
+    Возвращает (пароль верен, новый хэш или None). Новый хэш вычисляется в пуле,
+    если хэшер или число итераций устарели; сохранить его должен вызывающий.
+    """
+    if encoded is None:
+        password_pool.run(make_password, password)
+        return False, None
+    return password_pool.run(_check_and_upgrade, password, encoded)
+
+
+@observe_seconds(PASSWORD_VERIFY_SECONDS)
+async def acheck_password(password, encoded):
+    """Асинхронная версия verify_password()"""
+    if encoded is None:
+        await password_pool.arun(make_password, password)
+        return False, None
+    return await password_pool.arun(_check_and_upgrade, password, encoded)
+
+
+def _check_and_upgrade(password, encoded):
+    upgraded = []
+    valid = check_password(password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+    return valid, upgraded[0] if upgraded else None
+
+
+def hash_password(password):
+    """Вычисляет хэш пароля в пуле хэширования"""
+    return password_pool.run(make_password, password)
@@ -1,80 +1,447 @@
+import base64
+import hashlib
+import json
 import jwt
+import uuid
 
+from asgiref.sync import sync_to_async
+from cryptography.fernet import Fernet, InvalidToken
 from datetime import timedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from django.conf import settings
 
-from myauth.models import RefreshToken, BlacklistedToken
+from myauth.keys import get_key_ring
+from myauth.metrics import observe_seconds, CREATE_TOKENS_SECONDS
+from myauth.models import User, UserRole
+from myauth.shared_cache import is_shared_cache
+from myauth.token_cache import decoded_token_cache
+from myauth.token_store import get_token_store, CONSUMED, REUSED, EXPIRED
+from myauth.utils import token_digest
 
-SECRETE_KEY = settings.SECRET_KEY
-ALGORITHM = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
 REFRESH_TOKEN_EXPIRE_DAY = 7
+SELF_CONTAINED_ACCESS_TOKENS = getattr(settings, 'JWT_SELF_CONTAINED_ACCESS_TOKENS', False)
+USER_VERSIONS_CACHE_KEY = 'myauth:user_versions:{}'
+REFRESH_ROTATION_GRACE_SECONDS = getattr(settings, 'JWT_REFRESH_ROTATION_GRACE_SECONDS', 10)
 
-def create_jwt_token(user_id):
-    """Создает JWT-токен с заданным идентификатором пользователя и временем жизни"""
-    payload = {
-        'user_id': user_id,
-        'exp': timezone.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
-        'iat': timezone.now(),
+
+class RefreshTokenError(Exception):
+    """Refresh токен нельзя обменять на новую пару; message - текст ошибки для ответа"""
+
+def _build_claims(user, role_ids):
+    return {
+        'is_active': user['is_active'],
+        'is_staff': user['is_staff'],
+        'roles': role_ids,
+        'ver': user['auth_version'],
     }
 
-    token = jwt.encode(payload, SECRETE_KEY, algorithm=ALGORITHM)
-    return token
+def access_token_claims(user_id):
+    """Возвращает дополнительные claims самодостаточного access токена
+    (is_active, is_staff, роли и версию авторизации) или пустой словарь,
+    если режим JWT_SELF_CONTAINED_ACCESS_TOKENS выключен"""
+    if not SELF_CONTAINED_ACCESS_TOKENS:
+        return {}
 
-def create_jwt_tokens(user_id):
-    """Создает JWT-токены (access_token и refresh_token) с заданным идентификатором пользователя
-     и временем жизни"""
+    user = User.objects.filter(id=user_id).values('is_active', 'is_staff', 'auth_version').first()
+    if user is None:
+        return {}
+
+    role_ids = list(UserRole.objects.filter(user_id=user_id).values_list('role_id', flat=True))
+    return _build_claims(user, role_ids)
+
+async def aaccess_token_claims(user_id):
+    """Асинхронная версия access_token_claims()"""
+    if not SELF_CONTAINED_ACCESS_TOKENS:
+        return {}
+
+    user = await User.objects.filter(id=user_id).values('is_active', 'is_staff', 'auth_version').afirst()
+    if user is None:
+        return {}
+
+    role_ids = [role_id async for role_id in UserRole.objects.filter(user_id=user_id).values_list('role_id', flat=True)]
+    return _build_claims(user, role_ids)
+
+def _current_token_version(user_id):
+    versions = get_user_versions(user_id)
+    return versions[1] if versions else 0
+
+def _encode_token_pair(user_id, claims=None, family_id=None, token_version=0):
+    """Подписывает пару access/refresh токенов и возвращает её вместе с данными для хранилища токенов"""
     access_payload = {
         'user_id': user_id,
         'type': 'access',
         'exp': timezone.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
         'iat': timezone.now(),
+        'jti': uuid.uuid4().hex,
+        'fam': str(family_id),
+        'tv': token_version,
+        **(claims or {}),
     }
-    access_token = jwt.encode(access_payload, SECRETE_KEY, algorithm=ALGORITHM)
+    access_token = get_key_ring().encode(access_payload)
 
     refresh_payload = {
         'user_id': user_id,
         'type': 'refresh',
         'exp': timezone.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAY),
-        'iat': timezone.now()
+        'iat': timezone.now(),
+        'jti': uuid.uuid4().hex,
+        'fam': str(family_id),
+        'tv': token_version,
+    }
+    refresh_token = get_key_ring().encode(refresh_payload)
+
+    refresh_row = {
+        'user_id': user_id,
+        'token_hash': token_digest(refresh_token),
+        'expired_at': timezone.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAY),
+        'family_id': family_id,
     }
-    refresh_token = jwt.encode(refresh_payload, SECRETE_KEY, algorithm=ALGORITHM)
+    return {'access_token': access_token, 'refresh_token': refresh_token}, refresh_row
+
+@observe_seconds(CREATE_TOKENS_SECONDS)
+def create_jwt_tokens(user_id, claims=None, token_version=None):
+    """Создает JWT-токены (access_token и refresh_token) с заданным идентификатором пользователя
+     и временем жизни. token_version - текущая версия токенов пользователя (если не передана, берется из кэша)"""
+    if token_version is None:
+        token_version = _current_token_version(user_id)
+    tokens, refresh_row = _encode_token_pair(user_id, claims, uuid.uuid4(), token_version)
+    get_token_store().issue(**refresh_row)
+    return tokens
 
-    RefreshToken.objects.create(
-        user_id=user_id,
-        token=refresh_token,
-        expired_at=timezone.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAY)
+@observe_seconds(CREATE_TOKENS_SECONDS)
+async def acreate_jwt_tokens(user_id, claims=None, token_version=None):
+    """Асинхронная версия create_jwt_tokens()"""
+    if token_version is None:
+        versions = await aget_user_versions(user_id)
+        token_version = versions[1] if versions else 0
+    tokens, refresh_row = _encode_token_pair(user_id, claims, uuid.uuid4(), token_version)
+    await get_token_store().aissue(**refresh_row)
+    return tokens
+
+def token_family(payload):
+    """Цепочка ротации из claim fam или None для токенов, выданных без неё"""
+    try:
+        return uuid.UUID(payload['fam'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _family_id(payload):
+    """Цепочка ротации из claim fam; токены, выданные до ротации, начинают новую цепочку"""
+    return token_family(payload) or uuid.uuid4()
+
+def family_digest(family_id):
+    """Дайджест, под которым в хранилище отозванных токенов отзываются access токены цепочки"""
+    return token_digest(f'family:{family_id}')
+
+def revoke_token_family(user_id, family_id):
+    """Отзывает цепочку ротации: её refresh токены и выданные ей access токены.
+
+    Access токены отзываются одной записью на цепочку (family_digest()) на срок жизни
+    access токена; остальные сессии пользователя продолжают работать.
+    """
+    if family_id is None:
+        return
+    store = get_token_store()
+    store.revoke_family(family_id)
+    store.revoke(user_id, family_digest(family_id), timezone.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+def _rotation_error(result):
+    """Преобразует неуспешный RotationResult в RefreshTokenError"""
+    if result.status == EXPIRED:
+        return RefreshTokenError('refresh_token истек!')
+    if result.status == REUSED:
+        return RefreshTokenError('refresh_token уже использован, сессия отозвана!')
+    return RefreshTokenError('refresh_token не найден!')
+
+def _check_refresh_version(payload, versions):
+    """Проверяет версию токенов refresh токена и возвращает текущую версию пользователя"""
+    if versions is None:
+        raise RefreshTokenError('Пользователь не найден!')
+    if payload.get('tv', 0) != versions[1]:
+        raise RefreshTokenError('refresh_token отозван!')
+    return versions[1]
+
+def _in_grace_window(result):
+    return (
+        result.status == REUSED
+        and result.used_at is not None
+        and timezone.now() - result.used_at < timedelta(seconds=REFRESH_ROTATION_GRACE_SECONDS)
     )
 
-    return {'access_token': access_token, 'refresh_token': refresh_token}
+def _successor_cipher():
+    key = hashlib.sha256(f'myauth.rotation-successor:{settings.SECRET_KEY}'.encode('utf-8')).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+def _seal_successor(tokens):
+    """Шифрует выданную при ротации пару для хранения рядом со списанным токеном"""
+    return _successor_cipher().encrypt(json.dumps(tokens).encode('utf-8'))
+
+def _open_successor(result):
+    """Возвращает пару, выданную при списании токена, если повтор пришёл в окне
+    JWT_REFRESH_ROTATION_GRACE_SECONDS; иначе None"""
+    if not _in_grace_window(result) or result.successor is None:
+        return None
+    try:
+        return json.loads(_successor_cipher().decrypt(result.successor))
+    except InvalidToken:
+        return None
+
+def _revoke_reused(result):
+    """Повторное предъявление вне окна - кража: отзывается вся цепочка ротации"""
+    revoke_token_family(result.user_id, result.family_id)
+
+def rotate_refresh_token(refresh_token, payload):
+    """Обменивает refresh токен на новую пару с ротацией.
+
+    Старый токен списывается атомарно (UPDATE ... RETURNING), в той же записи сохраняется
+    зашифрованная новая пара. Параллельные запросы с тем же токеном в течение
+    JWT_REFRESH_ROTATION_GRACE_SECONDS получают эту пару без ожидания. Повторное
+    предъявление использованного токена вне этого окна считается кражей: цепочка
+    ротации и выданные ей access токены отзываются (revoke_token_family()).
+    Токены, выданные до последнего bump_token_version(), не обмениваются; версия
+    читается из БД, а не из кэша, чтобы выход на всех устройствах действовал сразу.
+    Бросает RefreshTokenError.
+    """
+    token_hash = token_digest(refresh_token)
+    user_id = payload['user_id']
+    token_version = _check_refresh_version(payload, _load_user_versions(user_id))
+    tokens, refresh_row = _encode_token_pair(
+        user_id, access_token_claims(user_id), _family_id(payload), token_version
+    )
+    result = get_token_store().rotate(token_hash, successor=_seal_successor(tokens), **refresh_row)
+    if result.status == CONSUMED:
+        return tokens
+
+    successor = _open_successor(result)
+    if successor is not None:
+        return successor
+
+    if result.status == REUSED:
+        _revoke_reused(result)
+    raise _rotation_error(result)
+
+async def arotate_refresh_token(refresh_token, payload):
+    """Асинхронная версия rotate_refresh_token()"""
+    token_hash = token_digest(refresh_token)
+    user_id = payload['user_id']
+    token_version = _check_refresh_version(payload, await _aload_user_versions(user_id))
+    tokens, refresh_row = _encode_token_pair(
+        user_id, await aaccess_token_claims(user_id), _family_id(payload), token_version
+    )
+    result = await get_token_store().arotate(token_hash, successor=_seal_successor(tokens), **refresh_row)
+    if result.status == CONSUMED:
+        return tokens
+
+    successor = _open_successor(result)
+    if successor is not None:
+        return successor
+
+    if result.status == REUSED:
+        await sync_to_async(_revoke_reused)(result)
+    raise _rotation_error(result)
+
+def verify_jwt_token(token):
+    """Проверяет подпись и срок действия JWT-токена и возвращает полезную нагрузку.
+
+    Проверенные нагрузки кэшируются по дайджесту токена до его exp, поэтому повторные
+    запросы с тем же токеном не повторяют base64, разбор JSON и проверку подписи.
+    Ключ проверки выбирается по заголовку kid (см. myauth.keys).
+    Бросает jwt.ExpiredSignatureError / jwt.InvalidTokenError.
+    """
+    token_hash = token_digest(token)
+    payload = decoded_token_cache.get(token_hash)
+    if payload is None:
+        payload = get_key_ring().decode(token)
+        decoded_token_cache.set(token_hash, payload)
+    return payload
 
 def decode_jwt_token(token):
     """Декодирует JWT-токен и возвращает полезную нагрузку, если токен валиден и не истёк"""
     try:
-        payload = jwt.decode(token, SECRETE_KEY, algorithms=[ALGORITHM])
+        payload = verify_jwt_token(token)
         return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
-def is_token_blacklisted(token):
-    """Проверяет есть ли токен в Blacklisted"""
-    try:
-        blacklisted = BlacklistedToken.objects.get(token=token)
-        if blacklisted.is_expired():
-            blacklisted.delete()
-            return False
-        return True
-    except BlacklistedToken.DoesNotExist:
-        return False
+def introspect_tokens(tokens):
+    """Проверяет пакет токенов: подпись и срок, отзыв и активность пользователя.
+
+    Access токены сверяются с хранилищем отозванных токенов (сам токен и его цепочка ротации), refresh токены - с хранилищем
+    refresh токенов: активен только найденный и ещё не использованный (не удалённый
+    при logout, не обменянный при ротации и не отозванный вместе с цепочкой). Хранилища и пользователи
+    проверяются запросами по множествам (token_hash__in, id__in), а не по одному на токен.
+    Токены декодируются в обход decoded_token_cache: пакет чужих токенов не должен
+    вытеснять из него токены, с которыми приходят запросы.
+    Возвращает список словарей в порядке входных токенов.
+    """
+    results = []
+    decoded = []
+    for token in tokens:
+        try:
+            payload = get_key_ring().decode(token)
+        except jwt.InvalidTokenError:
+            payload = None
+        token_hash = token_digest(token)
+        decoded.append((token_hash, payload))
+
+    store = get_token_store()
+    revocation_hashes = {
+        token_hash: _revocation_hashes(token_hash, payload)
+        for token_hash, payload in decoded if payload and payload.get('type') != 'refresh'
+    }
+    refresh_hashes = [token_hash for token_hash, payload in decoded if payload and payload.get('type') == 'refresh']
+    revoked = store.revoked_many(
+        [digest for digests in revocation_hashes.values() for digest in digests]
+    ) if revocation_hashes else set()
+    active_refresh = store.active_many(refresh_hashes) if refresh_hashes else set()
+
+    user_ids = {payload.get('user_id') for _, payload in decoded if payload}
+    users = {
+        user_id: (is_active, auth_version, token_version)
+        for user_id, is_active, auth_version, token_version in User.objects.filter(id__in=user_ids).values_list(
+            'id', 'is_active', 'auth_version', 'token_version'
+        )
+    } if user_ids else {}
+
+    for token_hash, payload in decoded:
+        if payload is None:
+            results.append({'active': False, 'user_id': None, 'exp': None, 'revoked': False})
+            continue
+
+        user_id = payload.get('user_id')
+        if payload.get('type') == 'refresh':
+            is_revoked = token_hash not in active_refresh
+        else:
+            is_revoked = any(digest in revoked for digest in revocation_hashes[token_hash])
+        is_active, auth_version, token_version = users.get(user_id, (False, None, None))
+        if 'ver' in payload and payload['ver'] != auth_version:
+            is_active = False
+        if payload.get('tv', 0) != token_version:
+            is_active = False
+
+        results.append({
+            'active': is_active and not is_revoked,
+            'user_id': user_id,
+            'exp': payload.get('exp'),
+            'revoked': is_revoked,
+        })
+    return results
+
+def _revocation_hashes(token_hash, payload):
+    """Дайджесты, по которым отзывается access токен: сам токен и его цепочка ротации"""
+    family_id = token_family(payload) if payload else None
+    if family_id is None:
+        return [token_hash]
+    return [token_hash, family_digest(family_id)]
+
+
+def is_token_blacklisted(token, payload=None):
+    """Проверяет есть ли токен в Blacklisted (в хранилище отозванных токенов).
+    С payload проверяется и отзыв его цепочки ротации - тем же обращением к хранилищу"""
+    token_hashes = _revocation_hashes(token_digest(token), payload)
+    store = get_token_store()
+    if len(token_hashes) == 1:
+        return store.is_revoked(token_hashes[0])
+    return bool(store.revoked_many(token_hashes))
+
+
+async def ais_token_blacklisted(token, payload=None):
+    """Асинхронная версия is_token_blacklisted()"""
+    token_hashes = _revocation_hashes(token_digest(token), payload)
+    store = get_token_store()
+    if len(token_hashes) == 1:
+        return await store.ais_revoked(token_hashes[0])
+    return bool(await store.arevoked_many(token_hashes))
+
+
+def blacklist_token(user_id, token, expired_at):
+    """Помещает access токен в Blacklisted (хранилище отозванных токенов)"""
+    token_hash = token_digest(token)
+    get_token_store().revoke(user_id, token_hash, expired_at)
+    decoded_token_cache.discard(token_hash)
+
+
+async def ablacklist_token(user_id, token, expired_at):
+    """Асинхронная версия blacklist_token()"""
+    token_hash = token_digest(token)
+    await get_token_store().arevoke(user_id, token_hash, expired_at)
+    decoded_token_cache.discard(token_hash)
+
+
+def _load_user_versions(user_id):
+    """Читает (auth_version, token_version) пользователя из БД; None - пользователь не найден"""
+    return User.objects.filter(id=user_id).values_list('auth_version', 'token_version').first()
+
+
+async def _aload_user_versions(user_id):
+    return await User.objects.filter(id=user_id).values_list('auth_version', 'token_version').afirst()
+
+
+def get_user_versions(user_id):
+    """Возвращает (auth_version, token_version) пользователя из общего кэша,
+    обращаясь к БД только при промахе. None - пользователь не найден.
+
+    Без общего кэша (см. myauth.shared_cache) версии читаются из БД: изменение,
+    сделанное другим воркером, иначе не было бы видно до истечения записи.
+    """
+    if not is_shared_cache():
+        return _load_user_versions(user_id)
+
+    key = USER_VERSIONS_CACHE_KEY.format(user_id)
+    versions = cache.get(key)
+    if versions is None:
+        versions = _load_user_versions(user_id)
+        if versions is not None:
+            cache.add(key, versions, timeout=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    return versions
+
+
+async def aget_user_versions(user_id):
+    """Асинхронная версия get_user_versions()"""
+    if not is_shared_cache():
+        return await _aload_user_versions(user_id)
+
+    key = USER_VERSIONS_CACHE_KEY.format(user_id)
+    versions = await cache.aget(key)
+    if versions is None:
+        versions = await _aload_user_versions(user_id)
+        if versions is not None:
+            await cache.aadd(key, versions, timeout=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    return versions
+
+
+def _refresh_user_versions(user_id):
+    """Записывает в кэш версии пользователя после коммита.
+
+    Читатели кладут значение через cache.add, поэтому прочитанная до коммита
+    старая версия не перезапишет новую.
+    """
+    key = USER_VERSIONS_CACHE_KEY.format(user_id)
+    versions = _load_user_versions(user_id)
+    if versions is None:
+        cache.delete(key)
+    else:
+        cache.set(key, versions, timeout=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 
+def bump_auth_version(user_id):
+    """Увеличивает версию авторизации пользователя, делая недействительными
+    выданные ему самодостаточные access токены"""
+    User.objects.filter(id=user_id).update(auth_version=F('auth_version') + 1)
+    transaction.on_commit(lambda: _refresh_user_versions(user_id))
 
-def clean_user_tokens(user_id):
-    """проверка и удаление из БД истекших RefreshToken и BlacklistedToken"""
-    now = timezone.now()
-    RefreshToken.objects.filter(user_id=user_id, expired_at__lt=now).delete()
 
-    BlacklistedToken.objects.filter(user_id=user_id, expired_at__lt=now).delete()
+def bump_token_version(user_id):
+    """Увеличивает версию токенов пользователя ("выход на всех устройствах").
 
+    Все выданные ранее access и refresh токены перестают приниматься сразу,
+    без записей в хранилище отозванных токенов.
+    """
+    User.objects.filter(id=user_id).update(token_version=F('token_version') + 1)
+    transaction.on_commit(lambda: _refresh_user_versions(user_id))
@@ -0,0 +1,109 @@
+import functools
+import hashlib
+import json
+
+import jwt
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from jwt.algorithms import get_default_algorithms
+
+SYMMETRIC_ALGORITHMS = ('HS256', 'HS384', 'HS512')
+
+
+class SigningKey:
+    """Ключ из связки: kid, алгоритм и подготовленные ключи подписи и проверки.
+
+    Для HS* используется общий секрет, для RS256/ES256/EdDSA - пара ключей в PEM;
+    ключ без private_key служит только для проверки (выведенный из ротации).
+    """
+    def __init__(self, kid, algorithm, secret=None, private_key=None, public_key=None):
+        algorithms = get_default_algorithms()
+        if algorithm not in algorithms:
+            raise ImproperlyConfigured(
+                f'Алгоритм {algorithm} для ключа {kid} недоступен (для RS256/ES256/EdDSA нужен пакет cryptography)'
+            )
+
+        self.kid = kid
+        self.algorithm = algorithm
+        self._impl = algorithms[algorithm]
+
+        if algorithm in SYMMETRIC_ALGORITHMS:
+            if not secret:
+                raise ImproperlyConfigured(f'Для ключа {kid} ({algorithm}) требуется secret')
+            self.signing_key = self.verifying_key = self._impl.prepare_key(secret)
+            return
+
+        if not private_key and not public_key:
+            raise ImproperlyConfigured(f'Для ключа {kid} ({algorithm}) требуется private_key или public_key')
+        self.signing_key = self._impl.prepare_key(private_key) if private_key else None
+        self.verifying_key = (
+            self._impl.prepare_key(public_key) if public_key else self.signing_key.public_key()
+        )
+
+    @property
+    def is_symmetric(self):
+        return self.algorithm in SYMMETRIC_ALGORITHMS
+
+    def to_jwk(self):
+        """Публичная часть ключа в формате JWK"""
+        jwk = self._impl.to_jwk(self.verifying_key, as_dict=True)
+        jwk.update({'kid': self.kid, 'alg': self.algorithm, 'use': 'sig'})
+        return jwk
+
+
+class KeyRing:
+    """Связка ключей подписи JWT.
+
+    Токены подписываются активным ключом (signing_kid) и получают заголовок kid;
+    проверка выбирает ключ по kid, поэтому старые ключи можно держать в связке,
+    пока не истекут подписанные ими токены. Токены без kid (выданные до появления
+    связки) проверяются HS256 с legacy_secret, если он задан.
+    """
+    def __init__(self, keys, signing_kid, legacy_secret=None):
+        self.keys = {key.kid: key for key in keys}
+        if signing_kid not in self.keys or self.keys[signing_kid].signing_key is None:
+            raise ImproperlyConfigured(f'Ключ подписи {signing_kid} отсутствует в JWT_KEYS или не содержит закрытого ключа')
+        self.signing = self.keys[signing_kid]
+        self.legacy_secret = legacy_secret
+
+    def encode(self, payload):
+        return jwt.encode(
+            payload, self.signing.signing_key, algorithm=self.signing.algorithm, headers={'kid': self.signing.kid}
+        )
+
+    def decode(self, token):
+        """Проверяет токен ключом из заголовка kid. Бросает jwt.InvalidTokenError и наследников"""
+        kid = jwt.get_unverified_header(token).get('kid')
+        if kid is None:
+            if not self.legacy_secret:
+                raise jwt.InvalidTokenError('Токен без kid')
+            return jwt.decode(token, self.legacy_secret, algorithms=['HS256'])
+
+        key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f'Неизвестный kid {kid}')
+        return jwt.decode(token, key.verifying_key, algorithms=[key.algorithm])
+
+    @functools.cached_property
+    def jwks(self):
+        """JWKS с публичными ключами (симметричные ключи не публикуются)"""
+        return {'keys': [key.to_jwk() for key in self.keys.values() if not key.is_symmetric]}
+
+    @functools.cached_property
+    def jwks_body(self):
+        """Сериализованный JWKS и его ETag"""
+        body = json.dumps(self.jwks, separators=(',', ':')).encode('utf-8')
+        return body, '"{}"'.format(hashlib.sha256(body).hexdigest()[:32])
+
+
+@functools.lru_cache(maxsize=None)
+def get_key_ring():
+    """Собирает связку ключей из настроек JWT_KEYS / JWT_SIGNING_KEY_ID"""
+    key_settings = getattr(settings, 'JWT_KEYS', None) or {
+        'default': {'algorithm': 'HS256', 'secret': settings.SECRET_KEY},
+    }
+    keys = [SigningKey(kid, **options) for kid, options in key_settings.items()]
+    signing_kid = getattr(settings, 'JWT_SIGNING_KEY_ID', 'default')
+    legacy_secret = settings.SECRET_KEY if getattr(settings, 'JWT_ACCEPT_UNKEYED_TOKENS', True) else None
+    return KeyRing(keys, signing_kid, legacy_secret)
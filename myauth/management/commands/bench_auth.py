@@ -0,0 +1,98 @@
+import io
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from myauth.benchmarks import run_micro_benchmarks, run_json_benchmarks, LoadDriver, environment, compare
+from myauth.models import User
+
+
+class Command(BaseCommand):
+    """Команда запускает бенчмарки сервиса авторизации.
+
+    Микро-бенчмарки create_jwt_tokens, decode_jwt_token, is_token_blacklisted, has_permission
+    и JWTAuthentication.authenticate, а также сериализация ответов и разбор тел запросов эндпоинтов
+    стандартным json и FastJSONRenderer/FastJSONParser выполняются во временной тестовой БД
+    (SQLite или PostgreSQL из настроек) с данными create_test_users. С --url дополнительно запускается нагрузочный тест
+    по HTTP против работающего сервера. Результаты сохраняются в JSON (--output); с --baseline
+    команда завершается ошибкой, если метрика выросла больше чем на --threshold.
+    """
+    help = 'Бенчмарки горячих функций и нагрузочный тест сервиса авторизации с сохранением результатов в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='user@mail.ru', help='Пользователь для бенчмарков и нагрузочного теста')
+        parser.add_argument('--password', default='userpassword', help='Пароль пользователя для нагрузочного теста')
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--warmup', type=int, default=100)
+        parser.add_argument('--use-existing-db', action='store_true',
+                            help='Запускать микро-бенчмарки на БД из настроек, а не на временной тестовой')
+        parser.add_argument('--url', default=None,
+                            help='Адрес работающего сервера для нагрузочного теста, например http://127.0.0.1:8000')
+        parser.add_argument('--sessions', type=int, default=200, help='Число сессий нагрузочного теста')
+        parser.add_argument('--concurrency', type=int, default=8, help='Число параллельных сессий')
+        parser.add_argument('--output', default=None, help='Файл для сохранения результатов (JSON)')
+        parser.add_argument('--baseline', default=None, help='Файл с результатами базового прогона (JSON)')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимый относительный рост метрики относительно базового прогона')
+        parser.add_argument('--metric', default='p50_ms', help='Метрика для сравнения с базовым прогоном')
+
+    def run_micro(self, options):
+        user = User.objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f"Пользователь {options['email']} не найден")
+        results = run_micro_benchmarks(user, options['iterations'], options['warmup'])
+        results.update(run_json_benchmarks(user, options['iterations'], options['warmup']))
+        return results
+
+    def handle(self, *args, **options):
+        if options['use_existing_db']:
+            results = self.run_micro(options)
+        else:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                call_command('create_test_users', stdout=io.StringIO())
+                results = self.run_micro(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['url']:
+            driver = LoadDriver(options['url'], options['email'], options['password'])
+            results.update(driver.run(options['sessions'], options['concurrency']))
+
+        for name, summary in results.items():
+            if 'p50_ms' in summary:
+                self.stdout.write(
+                    f"{name}: p50={summary['p50_ms'] or 0:.3f}ms p99={summary['p99_ms'] or 0:.3f}ms "
+                    f"ops={summary['ops_per_sec'] or 0:.0f}/s errors={summary['errors']}"
+                )
+            else:
+                self.stdout.write(
+                    f"{name}: {summary['count']} запросов за {summary['wall_time_s']:.1f}s "
+                    f"({summary['requests_per_sec'] or 0:.0f} rps), ошибок {summary['errors']}"
+                )
+
+        report = {
+            'environment': environment(),
+            'options': {key: options[key] for key in ('iterations', 'warmup', 'url', 'sessions', 'concurrency')},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)['results']
+
+            regressions = compare(results, baseline, options['threshold'], options['metric'])
+            for name, base_value, value, change in regressions:
+                self.stdout.write(self.style.ERROR(
+                    f"{name}: {options['metric']} {base_value:.3f} -> {value:.3f} (+{change:.0%})"
+                ))
+            if regressions:
+                raise CommandError(f'Регрессия производительности: {len(regressions)} метрик хуже базовых')
+            self.stdout.write(self.style.SUCCESS('Регрессий относительно базового прогона нет'))
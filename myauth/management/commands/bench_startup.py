@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from myauth.benchmarks import measure_startup, environment
+
+
+class Command(BaseCommand):
+    """Команда сравнивает холодный старт воркера и накладные расходы middleware для профилей настроек.
+
+    Для каждого профиля (по умолчанию effective_mobile.settings и effective_mobile.settings_api)
+    несколько раз запускается отдельный процесс: django.setup(), сборка WSGI-приложения, первый
+    запрос (загрузка URLconf и представлений) и серия запросов к --path без обращения к БД.
+    """
+    help = 'Время загрузки воркера и первого запроса, задержка запроса для профилей настроек'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-modules', nargs='+',
+                            default=['effective_mobile.settings', 'effective_mobile.settings_api'])
+        parser.add_argument('--runs', type=int, default=5, help='Число запусков процесса на профиль')
+        parser.add_argument('--requests', type=int, default=2000, help='Число запросов после первого')
+        parser.add_argument('--path', default='/.well-known/jwks.json', help='Путь запроса (без обращения к БД)')
+        parser.add_argument('--output', default=None, help='Файл для сохранения результатов (JSON)')
+
+    def handle(self, *args, **options):
+        results = {}
+        for settings_module in options['settings_modules']:
+            summary = measure_startup(settings_module, options['runs'], options['requests'], options['path'])
+            results[f'startup.{settings_module}'] = summary
+            self.stdout.write(
+                f"{settings_module}: готов к запросам через {summary['ready_s'] * 1000:.0f}ms "
+                f"(setup {summary['setup_s'] * 1000:.0f}ms, "
+                f"первый запрос {summary['first_request_s'] * 1000:.0f}ms), "
+                f"запрос p50={summary['request_p50_ms']:.3f}ms p99={summary['request_p99_ms']:.3f}ms, "
+                f"модулей {summary['modules']}, статус {summary['status']}"
+            )
+
+        if options['output']:
+            report = {
+                'environment': environment(),
+                'options': {key: options[key] for key in ('settings_modules', 'runs', 'requests', 'path')},
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
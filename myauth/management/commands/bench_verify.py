@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from myauth.benchmarks import percentile
+from myauth.jwt_utils import create_jwt_tokens, access_token_claims
+from myauth.models import User
+
+
+class Command(BaseCommand):
+    """Команда сравнивает задержку /api/auth/verify и UserProfileView (/api/auth/user/)
+    на прогретом кэше, запросы проходят через полный стек middleware"""
+    help = 'Микро-бенчмарк /api/auth/verify против /api/auth/user/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='user@mail.ru', help='Пользователь, для которого выдаётся токен')
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--warmup', type=int, default=100)
+
+    def measure(self, client, path, headers, iterations, warmup):
+        for _ in range(warmup):
+            client.get(path, headers=headers)
+
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = client.get(path, headers=headers)
+            samples.append(time.perf_counter() - started)
+
+        if response.status_code != 200:
+            raise CommandError(f'{path} вернул {response.status_code}')
+        return samples
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f"Пользователь {options['email']} не найден")
+
+        token = create_jwt_tokens(user.id, access_token_claims(user.id))['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+        host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+        client = Client(HTTP_HOST=host)
+
+        for path in ('/api/auth/verify', '/api/auth/user/'):
+            samples = self.measure(client, path, headers, options['iterations'], options['warmup'])
+            self.stdout.write(
+                f'{path}: p50={percentile(samples, 50) * 1000:.3f}ms '
+                f'p99={percentile(samples, 99) * 1000:.3f}ms '
+                f'rps={len(samples) / sum(samples):.0f}'
+            )
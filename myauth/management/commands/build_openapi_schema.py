@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from myauth.openapi import OPENAPI_SCHEMA_DIR, generate_schema, write_schema_artifacts
+
+
+class Command(BaseCommand):
+    """Команда собирает схему OpenAPI при сборке приложения.
+
+    Схема генерируется один раз и записывается в версионированные файлы openapi.<хэш>.json/.yaml
+    со сжатыми копиями (.gz, .br при установленном brotli) и манифестом. /swagger.json, /swagger/
+    и /redoc/ отдают эти файлы без интроспекции представлений на каждый запрос.
+    """
+    help = 'Генерирует схему OpenAPI в версионированные файлы для раздачи документацией'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default=str(OPENAPI_SCHEMA_DIR),
+                            help='Каталог для файлов схемы (по умолчанию OPENAPI_SCHEMA_DIR)')
+
+    def handle(self, *args, **options):
+        manifest = write_schema_artifacts(generate_schema(), options['output_dir'])
+        for schema_file in manifest['files'].values():
+            encodings = ', '.join(schema_file['encodings']) or 'без сжатия'
+            self.stdout.write(f"{schema_file['name']}: {schema_file['size']} байт ({encodings})")
+        self.stdout.write(self.style.SUCCESS(
+            f"Схема версии {manifest['version']} записана в {options['output_dir']}"
+        ))
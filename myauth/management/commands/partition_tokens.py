@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+
+from myauth.partitioning import (
+    PARTITIONED_MODELS,
+    PARTITION_DAYS_AHEAD,
+    is_supported,
+    is_partitioned,
+    convert_to_partitioned,
+    create_partitions,
+    drop_expired_partitions,
+    check_default_partition
+)
+from myauth.token_reaper import reap_expired_tokens
+
+
+class Command(BaseCommand):
+    """Команда обслуживает секционированные по expired_at таблицы RefreshToken и BlacklistedToken.
+
+    Создаёт суточные секции на --days-ahead дней вперёд и удаляет секции с истекшими токенами;
+    запускается раз в сутки. Строки в секции DEFAULT пишутся ошибкой в лог myauth.partitioning
+    (для алерта) и в stderr. На СУБД без секционирования (SQLite) удаляет истекшие строки пачками.
+    """
+    help = 'Создаёт будущие и удаляет истекшие секции таблиц токенов (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Перевести несекционированные таблицы токенов в секционированные')
+        parser.add_argument('--days-ahead', type=int, default=PARTITION_DAYS_AHEAD,
+                            help='На сколько суток вперёд создавать секции')
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            self.stdout.write(self.style.WARNING(
+                'Секционирование не поддерживается этой СУБД, истекшие токены удаляются построчно'
+            ))
+            for model_name, count in reap_expired_tokens().items():
+                self.stdout.write(self.style.SUCCESS(f'{model_name}: удалено {count} истекших токенов'))
+            return
+
+        for model in PARTITIONED_MODELS:
+            name = model.__name__
+            if not is_partitioned(model):
+                if not options['convert']:
+                    self.stdout.write(self.style.WARNING(
+                        f'{name}: таблица не секционирована, запустите команду с --convert'
+                    ))
+                    continue
+                convert_to_partitioned(model, options['days_ahead'])
+                self.stdout.write(self.style.SUCCESS(f'{name}: таблица переведена в секционированную'))
+
+            created = create_partitions(model, options['days_ahead'])
+            dropped = drop_expired_partitions(model)
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: создано секций {len(created)}, удалено истекших секций {len(dropped)}'
+            ))
+
+            stray = check_default_partition(model)
+            if stray:
+                self.stderr.write(self.style.ERROR(
+                    f'{name}: в секции DEFAULT {stray} строк, проверьте --days-ahead и расписание команды'
+                ))
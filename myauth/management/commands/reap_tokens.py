@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myauth.token_reaper import DEFAULT_BATCH_SIZE
+from myauth.token_store import get_token_store
+
+
+class Command(BaseCommand):
+    """Команда удаляет из хранилища токенов истекшие RefreshToken и BlacklistedToken пачками"""
+    help = 'Удаляет истекшие RefreshToken и BlacklistedToken пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Количество строк в одном DELETE')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Пауза между пачками, секунды')
+        parser.add_argument('--max-runtime', type=float, default=None,
+                            help='Максимальное время работы, секунды (0 - по одной пачке из каждой таблицы)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size должен быть больше нуля')
+        if options['max_runtime'] is not None and options['max_runtime'] < 0:
+            raise CommandError('--max-runtime не может быть отрицательным')
+
+        deleted = get_token_store().purge(
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            max_runtime=options['max_runtime'],
+        )
+
+        for model_name, count in deleted.items():
+            self.stdout.write(self.style.SUCCESS(f'{model_name}: удалено {count} истекших токенов'))
@@ -0,0 +1,87 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from myauth.management.commands.create_test_users import Command as CreateTestUsersCommand
+from myauth.models import Role
+from myauth.feed import bump_feed_version
+from myauth.permission_matrix import permission_matrix
+from myauth.response_cache import bump_all_profile_versions
+from myauth.seeding import BASE_ROLE, seed_roles_and_resources, seed_users, seed_posts
+
+
+class Command(BaseCommand):
+    """Команда заполняет БД синтетическими данными для нагрузочного тестирования:
+    пользователи seed<N>@<domain>, роли, ресурсы, матрица прав, живые refresh и отозванные токены,
+    посты новостной ленты.
+
+    Вставка идёт пачками через bulk_create, хэш пароля вычисляется один раз на всех пользователей.
+    bulk_create не отправляет сигналы, поэтому в конце матрица прав, лента и кэш ответов
+    сбрасываются явно. Повторный запуск с теми же параметрами не создаёт дубликатов и досоздаёт недостающее.
+    """
+    help = 'Заполняет БД синтетическими пользователями, ролями, правами и токенами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000, help='Число пользователей')
+        parser.add_argument('--roles', type=int, default=20, help='Число синтетических ролей')
+        parser.add_argument('--resources', type=int, default=50, help='Число синтетических ресурсов')
+        parser.add_argument('--permission-density', type=float, default=0.3,
+                            help='Доля ресурсов, на которые у роли есть права')
+        parser.add_argument('--refresh-tokens', type=float, default=1.5,
+                            help='Среднее число живых refresh токенов на пользователя')
+        parser.add_argument('--blacklisted', type=float, default=0.05,
+                            help='Доля пользователей с отозванным access токеном')
+        parser.add_argument('--posts', type=int, default=0, help='Число постов новостной ленты')
+        parser.add_argument('--password', default='seedpassword', help='Пароль всех синтетических пользователей')
+        parser.add_argument('--domain', default='seed.local', help='Домен email синтетических пользователей')
+        parser.add_argument('--chunk-size', type=int, default=10_000, help='Пользователей в одной пачке')
+        parser.add_argument('--batch-size', type=int, default=5_000, help='Строк в одном INSERT')
+        parser.add_argument('--workers', type=int, default=1, help='Число процессов (PostgreSQL)')
+        parser.add_argument('--seed', type=int, default=42, help='Начальное значение генератора случайных чисел')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite не поддерживает параллельную запись, используется 1 процесс'))
+            workers = 1
+
+        # базовые роли и права (User, Moderator, Profile, NewsFeed), чтобы синтетические пользователи работали с API
+        CreateTestUsersCommand(stdout=self.stdout).init_roles_and_permissions()
+        role_ids = seed_roles_and_resources(
+            options['roles'], options['resources'], options['permission_density'], options['seed'], options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Роли: {len(role_ids)}, ресурсы: {options["resources"]}'))
+
+        chunk_options = {
+            'seed': options['seed'],
+            'domain': options['domain'],
+            'password_hash': make_password(options['password']),
+            'base_role_id': Role.objects.filter(name=BASE_ROLE).values_list('id', flat=True).first(),
+            'role_ids': role_ids,
+            'refresh_tokens': options['refresh_tokens'],
+            'blacklisted': options['blacklisted'],
+            'batch_size': options['batch_size'],
+        }
+
+        totals = {'users': 0, 'refresh_tokens': 0, 'blacklisted_tokens': 0}
+        for counts in seed_users(options['users'], options['chunk_size'], chunk_options, workers):
+            for key, value in counts.items():
+                totals[key] += value
+            self.stdout.write(
+                f"Пользователей: {totals['users']}/{options['users']}, "
+                f"refresh токенов: {totals['refresh_tokens']}, отозванных: {totals['blacklisted_tokens']}"
+            )
+
+        created_posts = 0
+        for count in seed_posts(options['posts'], options['batch_size']):
+            created_posts += count
+            self.stdout.write(f'Постов создано: {created_posts}')
+
+        permission_matrix.invalidate()
+        bump_feed_version()
+        bump_all_profile_versions()
+
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.monotonic() - started:.1f}s'))
@@ -0,0 +1,220 @@
+import functools
+import hmac
+import inspect
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+from myauth.query_budget import check_query_budget, get_query_budget
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+METRICS_ENABLED = getattr(settings, 'METRICS_ENABLED', True) and prometheus_client is not None
+METRICS_TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+AUTH_STAGES = ('header', 'decode', 'blacklist', 'user')
+
+
+class _NullMetric:
+    """Заглушка метрики, когда prometheus_client не установлен или метрики выключены"""
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+
+def _histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    if not METRICS_ENABLED:
+        return _NullMetric()
+    return prometheus_client.Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def _counter(name, documentation, labelnames=()):
+    if not METRICS_ENABLED:
+        return _NullMetric()
+    return prometheus_client.Counter(name, documentation, labelnames)
+
+
+def _gauge(name, documentation, labelnames=()):
+    if not METRICS_ENABLED:
+        return _NullMetric()
+    # livesum: при PROMETHEUS_MULTIPROC_DIR значения живых воркеров складываются
+    return prometheus_client.Gauge(name, documentation, labelnames, multiprocess_mode='livesum')
+
+
+AUTH_STAGE_SECONDS = _histogram(
+    'myauth_authenticate_stage_seconds', 'Время этапов JWTAuthentication.authenticate', ['stage']
+)
+# дочерние серии с метками создаются один раз, а не на каждый запрос
+AUTH_STAGE = {stage: AUTH_STAGE_SECONDS.labels(stage) for stage in AUTH_STAGES}
+
+HAS_PERMISSION_SECONDS = _histogram('myauth_has_permission_seconds', 'Время проверки has_permission')
+CREATE_TOKENS_SECONDS = _histogram('myauth_create_jwt_tokens_seconds', 'Время выдачи пары JWT токенов')
+PASSWORD_VERIFY_SECONDS = _histogram(
+    'myauth_password_verify_seconds', 'Время проверки пароля, включая ожидание в пуле хэширования'
+)
+PASSWORD_POOL_QUEUE_DEPTH = _gauge('myauth_password_pool_queue_depth', 'Задачи в очереди пула хэширования паролей')
+PASSWORD_POOL_RUNNING = _gauge('myauth_password_pool_running', 'Задачи, выполняемые пулом хэширования паролей')
+PASSWORD_POOL_WAIT_SECONDS = _histogram(
+    'myauth_password_pool_wait_seconds', 'Время ожидания задачи в очереди пула хэширования паролей'
+)
+PASSWORD_POOL_REJECTED = _counter(
+    'myauth_password_pool_rejected', 'Задачи, отклонённые пулом хэширования паролей (429)'
+)
+VIEW_DB_QUERIES = _histogram(
+    'myauth_view_db_queries', 'Число SQL-запросов на запрос к представлению', ['view'], buckets=QUERY_COUNT_BUCKETS
+)
+
+DECODED_TOKEN_CACHE_REQUESTS = _counter(
+    'myauth_decoded_token_cache_requests', 'Обращения к кэшу проверенных JWT (myauth.token_cache)', ['result']
+)
+DECODED_TOKEN_CACHE = {result: DECODED_TOKEN_CACHE_REQUESTS.labels(result) for result in ('hit', 'miss')}
+
+
+class StageTimer:
+    """Замеряет последовательные этапы: mark(stage) записывает время, прошедшее с предыдущей отметки"""
+    __slots__ = ('_last',)
+
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        AUTH_STAGE[stage].observe(now - self._last)
+        self._last = now
+
+
+def observe_seconds(histogram):
+    """Декоратор: записывает время выполнения функции (синхронной или асинхронной) в гистограмму"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class QueryCountMiddleware:
+    """Считает SQL-запросы на каждый запрос к представлению.
+
+    Число запросов пишется в VIEW_DB_QUERIES (метка view - имя URL) и сверяется
+    с бюджетом представления (см. myauth.query_budget). Счётчик подключается через
+    connection.execute_wrapper и стоит один вызов функции на запрос к БД.
+
+    Под ASGI счётчик ставится на соединение потока, в котором sync_to_async выполняет
+    async ORM и синхронные представления этого запроса (ThreadSensitiveContext обработчика).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _counter(sqls):
+        def count(execute, sql, params, many, context):
+            sqls.append(sql)
+            return execute(sql, params, many, context)
+        return count
+
+    @staticmethod
+    def _observe(request, sqls):
+        match = request.resolver_match
+        if match is None:
+            return
+
+        VIEW_DB_QUERIES.labels(match.view_name).observe(len(sqls))
+        check_query_budget(match.view_name, get_query_budget(match.func, request.method), sqls)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        sqls = []
+        with connection.execute_wrapper(self._counter(sqls)):
+            response = self.get_response(request)
+
+        self._observe(request, sqls)
+        return response
+
+    async def __acall__(self, request):
+        sqls = []
+        count = self._counter(sqls)
+        # connection - своё у каждого потока, поэтому обращение к нему тоже через sync_to_async
+        await sync_to_async(lambda: connection.execute_wrappers.append(count))()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(lambda: connection.execute_wrappers.remove(count))()
+
+        self._observe(request, sqls)
+        return response
+
+
+def metrics_token_valid(request):
+    """Сверяет заголовок Authorization: Bearer <METRICS_TOKEN> за постоянное время"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode('utf-8'), METRICS_TOKEN.encode('utf-8'))
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus.
+
+    Доступны только с токеном METRICS_TOKEN (Authorization: Bearer ...); без настроенного
+    токена - 403. Если задана переменная окружения PROMETHEUS_MULTIPROC_DIR (gunicorn
+    с несколькими воркерами), значения собираются из файлов всех воркеров.
+    """
+    if not METRICS_ENABLED:
+        raise Http404
+
+    if not METRICS_TOKEN:
+        return HttpResponseForbidden()
+
+    if not metrics_token_valid(request):
+        response = HttpResponse(status=401)
+        response['WWW-Authenticate'] = 'Bearer'
+        return response
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+
+    return HttpResponse(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
@@ -0,0 +1,60 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def fill_token_hash(apps, schema_editor):
+    """Заполняет token_hash дайджестами уже сохранённых токенов"""
+    for model_name in ('RefreshToken', 'BlacklistedToken'):
+        model = apps.get_model('myauth', model_name)
+        batch = []
+        for obj in model.objects.only('id', 'token').iterator(chunk_size=BATCH_SIZE):
+            obj.token_hash = hashlib.sha256(obj.token.encode('utf-8')).digest()
+            batch.append(obj)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, ['token_hash'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['token_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myauth', '0002_refreshtoken_blacklistedtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='token_hash',
+            field=models.BinaryField(max_length=32, null=True, verbose_name='SHA-256 токена'),
+        ),
+        migrations.AddField(
+            model_name='blacklistedtoken',
+            name='token_hash',
+            field=models.BinaryField(max_length=32, null=True, verbose_name='SHA-256 токена'),
+        ),
+        migrations.RunPython(fill_token_hash, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='refreshtoken',
+            name='token',
+        ),
+        migrations.RemoveField(
+            model_name='blacklistedtoken',
+            name='token',
+        ),
+        migrations.AlterField(
+            model_name='refreshtoken',
+            name='token_hash',
+            field=models.BinaryField(max_length=32, unique=True, verbose_name='SHA-256 токена'),
+        ),
+        migrations.AlterField(
+            model_name='blacklistedtoken',
+            name='token_hash',
+            field=models.BinaryField(max_length=32, unique=True, verbose_name='SHA-256 токена'),
+        ),
+    ]
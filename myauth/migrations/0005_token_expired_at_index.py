@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myauth', '0004_user_auth_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blacklistedtoken',
+            name='expired_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='refreshtoken',
+            name='expired_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
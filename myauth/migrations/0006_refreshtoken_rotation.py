@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myauth', '0005_token_expired_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='family_id',
+            field=models.UUIDField(db_index=True, null=True, verbose_name='Цепочка ротации'),
+        ),
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='used_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Использован'),
+        ),
+    ]
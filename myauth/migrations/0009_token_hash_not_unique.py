@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Только состояние моделей: секционированные таблицы (partition_tokens --convert) хранят
+    UNIQUE (token_hash, expired_at) вместо UNIQUE (token_hash), а в несекционированных
+    уникальный индекс остаётся и служит тем же поиском по token_hash."""
+
+    dependencies = [
+        ('myauth', '0008_post'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='blacklistedtoken',
+                    name='token_hash',
+                    field=models.BinaryField(db_index=True, max_length=32, verbose_name='SHA-256 токена'),
+                ),
+                migrations.AlterField(
+                    model_name='refreshtoken',
+                    name='token_hash',
+                    field=models.BinaryField(db_index=True, max_length=32, verbose_name='SHA-256 токена'),
+                ),
+            ],
+        ),
+    ]
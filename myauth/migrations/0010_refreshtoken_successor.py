@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myauth', '0009_token_hash_not_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='successor',
+            field=models.BinaryField(null=True, verbose_name='Выданная при ротации пара (зашифрована)'),
+        ),
+    ]
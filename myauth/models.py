@@ -30,6 +30,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField('Активен', default=True)
     is_staff = models.BooleanField('Персонал', default=False)
     date_add = models.DateTimeField('Дата регистрации', auto_now_add=True)
+    auth_version = models.PositiveIntegerField('Версия авторизации', default=0)
+    token_version = models.PositiveIntegerField('Версия токенов', default=0)
 
     objects = UserManager()
 
@@ -81,11 +83,21 @@ class Permission(models.Model):
 
 
 class RefreshToken(models.Model):
-    """Модель refresh токена"""
+    """Модель refresh токена.
+
+    При ротации использованный токен помечается used_at и остаётся до истечения,
+    чтобы повторное предъявление отзывало всю цепочку (family_id); successor хранит
+    выданную взамен пару для повторов в окне JWT_REFRESH_ROTATION_GRACE_SECONDS.
+    token_hash не объявлен уникальным: секционированная таблица (myauth.partitioning)
+    допускает уникальность только вместе с expired_at.
+    """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    token = models.CharField(max_length=300, unique=True)
+    token_hash = models.BinaryField('SHA-256 токена', max_length=32, db_index=True)
+    family_id = models.UUIDField('Цепочка ротации', null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    expired_at = models.DateTimeField()
+    used_at = models.DateTimeField('Использован', null=True, blank=True)
+    successor = models.BinaryField('Выданная при ротации пара (зашифрована)', null=True)
+    expired_at = models.DateTimeField(db_index=True)
 
     def is_expired(self):
         return timezone.now() >= self.expired_at
@@ -94,9 +106,27 @@ class RefreshToken(models.Model):
 class BlacklistedToken(models.Model):
     """Модель access токена добавленного в Blacklisted"""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    token = models.CharField(max_length=300, unique=True)
+    token_hash = models.BinaryField('SHA-256 токена', max_length=32, db_index=True)
     blacklisted_at = models.DateTimeField(auto_now_add=True)
-    expired_at = models.DateTimeField()
+    expired_at = models.DateTimeField(db_index=True)
 
     def is_expired(self):
         return timezone.now() >= self.expired_at
+
+
+class Post(models.Model):
+    """Модель поста новостной ленты.
+
+    Лента отдаётся по убыванию (created_at, id) с курсорной пагинацией по составному индексу.
+    """
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='posts')
+    title = models.CharField('Заголовок', max_length=200)
+    content = models.TextField('Содержимое')
+    created_at = models.DateTimeField('Создан', default=timezone.now)
+    updated_at = models.DateTimeField('Изменён', auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['-created_at', '-id'], name='myauth_post_feed_idx')]
+
+    def __str__(self):
+        return self.title
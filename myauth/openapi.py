@@ -0,0 +1,199 @@
+import functools
+import gzip
+import hashlib
+import json
+import os
+
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+from rest_framework import permissions
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+OPENAPI_SCHEMA_DIR = Path(getattr(settings, 'OPENAPI_SCHEMA_DIR', settings.BASE_DIR / 'build' / 'openapi'))
+MANIFEST_NAME = 'manifest.json'
+CONTENT_TYPES = {'.json': 'application/json', '.yaml': 'application/yaml'}
+# порядок предпочтения сжатых вариантов при согласовании Accept-Encoding
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+# версионированный файл не меняется: имя содержит хэш содержимого
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+
+def get_api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="Effective Mobile API",
+        default_version='v1',
+        description="API документация для проекта",
+        contact=openapi.Contact(email="ilya@example.com"),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_live_schema_view():
+    """SchemaView drf_yasg: схема строится интроспекцией всех представлений на каждый запрос"""
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(get_api_info(), public=True, permission_classes=[permissions.AllowAny])
+
+
+def generate_schema():
+    """Генерирует схему OpenAPI без привязки к запросу (host берётся клиентом из адреса документации).
+
+    Возвращает {'.json': bytes, '.yaml': bytes}.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+
+    generator = get_live_schema_view().generator_class(get_api_info())
+    schema = generator.get_schema(request=None, public=True)
+    return {
+        '.json': OpenAPICodecJson(validators=[]).encode(schema),
+        '.yaml': OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def compress(body, encoding):
+    if encoding == 'gzip':
+        # mtime=0 - одинаковая схема даёт побайтно одинаковый архив
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    return brotli.compress(body, quality=11)
+
+
+def write_schema_artifacts(bodies, directory=OPENAPI_SCHEMA_DIR):
+    """Записывает схему в файлы openapi.<хэш>.json/.yaml со сжатыми копиями .gz (и .br при
+    установленном brotli) и манифест с именами и ETag. Возвращает манифест."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    version = hashlib.sha256(bodies['.json']).hexdigest()[:16]
+
+    files = {}
+    for fmt, body in bodies.items():
+        name = f'openapi.{version}{fmt}'
+        encodings = [encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None]
+        (directory / name).write_bytes(body)
+        for encoding in encodings:
+            (directory / (name + ENCODINGS[encoding])).write_bytes(compress(body, encoding))
+        files[fmt] = {
+            'name': name,
+            'etag': hashlib.sha256(body).hexdigest()[:32],
+            'size': len(body),
+            'encodings': encodings,
+        }
+
+    manifest = {'version': version, 'files': files}
+    # манифест заменяется атомарно, после того как все файлы версии записаны
+    temporary = directory / (MANIFEST_NAME + '.tmp')
+    temporary.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    os.replace(temporary, directory / MANIFEST_NAME)
+    return manifest
+
+
+class SchemaFile:
+    """Собранный файл схемы в памяти: несжатое содержимое и предварительно сжатые варианты"""
+    def __init__(self, directory, name, etag, encodings, **extra):
+        self.name = name
+        self.content_type = CONTENT_TYPES[Path(name).suffix]
+        self.etag = etag
+        self.variants = {None: (directory / name).read_bytes()}
+        for encoding in encodings:
+            self.variants[encoding] = (directory / (name + ENCODINGS[encoding])).read_bytes()
+
+    def negotiate(self, accept_encoding):
+        """Лучший доступный вариант для заголовка Accept-Encoding (None - без сжатия)"""
+        accepted = {}
+        for item in accept_encoding.split(','):
+            coding, _, params = item.strip().partition(';')
+            quality = params.strip()[2:] if params.strip().startswith('q=') else '1'
+            try:
+                accepted[coding.strip().lower()] = float(quality)
+            except ValueError:
+                continue
+
+        for encoding in ENCODINGS:
+            if encoding in self.variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return encoding
+        return None
+
+    def response(self, request, cache_control):
+        encoding = self.negotiate(request.headers.get('Accept-Encoding', ''))
+        # сильный ETag различается для каждого варианта сжатия
+        etag = f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"'
+
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            body = self.variants[encoding]
+            response = HttpResponse(body, content_type=self.content_type)
+            response['Content-Length'] = len(body)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+class SchemaArtifacts:
+    """Схема, собранная командой build_openapi_schema: файлы по формату и по имени"""
+    def __init__(self, directory):
+        manifest = json.loads((directory / MANIFEST_NAME).read_text(encoding='utf-8'))
+        self.version = manifest['version']
+        self.by_format = {fmt: SchemaFile(directory, **options) for fmt, options in manifest['files'].items()}
+        self.by_name = {schema_file.name: schema_file for schema_file in self.by_format.values()}
+
+
+@functools.lru_cache(maxsize=None)
+def get_schema_artifacts():
+    """Загружает собранную схему из OPENAPI_SCHEMA_DIR один раз на процесс; None, если её нет"""
+    if not (OPENAPI_SCHEMA_DIR / MANIFEST_NAME).exists():
+        return None
+    return SchemaArtifacts(OPENAPI_SCHEMA_DIR)
+
+
+def live_fallback(artifacts):
+    """Живая генерация схемы допустима только в DEBUG, когда схема не собрана"""
+    if artifacts is None and not settings.DEBUG:
+        raise Http404('Схема OpenAPI не собрана: выполните python manage.py build_openapi_schema')
+    return artifacts is None
+
+
+@require_GET
+def schema_view(request, format):
+    """/swagger.json и /swagger.yaml: собранная схема с ревалидацией по ETag"""
+    artifacts = get_schema_artifacts()
+    if live_fallback(artifacts):
+        return get_live_schema_view().without_ui(cache_timeout=0)(request, format=format)
+    return artifacts.by_format[format].response(request, REVALIDATE_CACHE_CONTROL)
+
+
+@require_GET
+def schema_file_view(request, name):
+    """Версионированный файл схемы openapi.<хэш>.json/.yaml: кэшируется навсегда"""
+    artifacts = get_schema_artifacts()
+    schema_file = artifacts.by_name.get(name) if artifacts else None
+    if schema_file is None:
+        raise Http404('Версия схемы не найдена')
+    return schema_file.response(request, IMMUTABLE_CACHE_CONTROL)
+
+
+def docs_ui_view(renderer):
+    """Страница Swagger UI или ReDoc. Сама страница строится без интроспекции представлений,
+    а запрос схемы с неё (?format=openapi) обслуживается собранным файлом"""
+    @require_GET
+    def view(request):
+        artifacts = get_schema_artifacts()
+        live = live_fallback(artifacts)
+        if 'format' in request.GET and not live:
+            return artifacts.by_format['.json'].response(request, REVALIDATE_CACHE_CONTROL)
+        return get_live_schema_view().with_ui(renderer, cache_timeout=0)(request)
+    return view
@@ -0,0 +1,218 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from myauth.models import RefreshToken, BlacklistedToken
+
+PARTITIONED_MODELS = (RefreshToken, BlacklistedToken)
+PARTITION_DAYS_AHEAD = getattr(settings, 'JWT_TOKEN_PARTITION_DAYS_AHEAD', 14)
+
+logger = logging.getLogger(__name__)
+
+
+def is_supported():
+    """Секционирование по expired_at доступно только на PostgreSQL"""
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned(model):
+    """Проверяет, переведена ли таблица модели в секционированный режим"""
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [model._meta.db_table]
+        )
+        return cursor.fetchone() is not None
+
+
+def _utc_day(value):
+    return value.astimezone(datetime.timezone.utc).date()
+
+
+def _partition_name(table, day):
+    return f'{table}_p{day:%Y%m%d}'
+
+
+def _default_partition_name(table):
+    return f'{table}_default'
+
+
+def _existing_partitions(table):
+    """Возвращает {день: имя секции} для таблицы"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)',
+            [table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    prefix = f'{table}_p'
+    partitions = {}
+    for name in names:
+        try:
+            day = datetime.datetime.strptime(name[len(prefix):], '%Y%m%d').date()
+        except ValueError:
+            continue
+        partitions[day] = name
+    return partitions
+
+
+def _create_default_partition(cursor, table):
+    """Секция DEFAULT принимает строки вне суточных секций, чтобы вставка не падала"""
+    quote = connection.ops.quote_name
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {quote(_default_partition_name(table))} PARTITION OF {quote(table)} DEFAULT'
+    )
+
+
+def _create_partition(cursor, table, day):
+    """Создаёт суточную секцию, перенося в неё строки этих суток из секции DEFAULT
+    (иначе PostgreSQL не даст создать секцию, пересекающуюся с её строками)"""
+    quote = connection.ops.quote_name
+    start = datetime.datetime.combine(day, datetime.time.min, tzinfo=datetime.timezone.utc)
+    end = start + datetime.timedelta(days=1)
+    moved = f'{table}_moved'
+    with transaction.atomic():
+        cursor.execute(f'CREATE TEMPORARY TABLE {quote(moved)} (LIKE {quote(table)})')
+        cursor.execute(
+            f'WITH rows AS (DELETE FROM {quote(_default_partition_name(table))} '
+            f'WHERE {quote("expired_at")} >= %s AND {quote("expired_at")} < %s RETURNING *) '
+            f'INSERT INTO {quote(moved)} SELECT * FROM rows',
+            [start, end]
+        )
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS {quote(_partition_name(table, day))} PARTITION OF {quote(table)} '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(moved)}')
+        cursor.execute(f'DROP TABLE {quote(moved)}')
+
+
+def create_partitions(model, days_ahead=PARTITION_DAYS_AHEAD, last_day=None):
+    """Создаёт секцию DEFAULT и суточные секции с сегодняшнего дня (UTC) на days_ahead дней вперёд
+    (или до last_day, если он дальше). Возвращает имена созданных суточных секций.
+    """
+    table = model._meta.db_table
+    today = _utc_day(timezone.now())
+    last_day = max(last_day or today, today + datetime.timedelta(days=days_ahead))
+    existing = _existing_partitions(table)
+
+    created = []
+    with connection.cursor() as cursor:
+        _create_default_partition(cursor, table)
+        day = today
+        while day <= last_day:
+            if day not in existing:
+                _create_partition(cursor, table, day)
+                created.append(_partition_name(table, day))
+            day += datetime.timedelta(days=1)
+    return created
+
+
+def check_default_partition(model):
+    """Возвращает число строк в секции DEFAULT и пишет ошибку в лог myauth.partitioning, если они есть.
+
+    Строки попадают туда, только когда суточной секции не нашлось: partition_tokens давно
+    не запускался или expired_at дальше --days-ahead. Такие строки не удаляются DROP секции.
+    """
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM {quote(_default_partition_name(table))}')
+        count = cursor.fetchone()[0]
+    if count:
+        logger.error(
+            'В секции %s %d строк: суточные секции не покрывают expired_at, запустите partition_tokens',
+            _default_partition_name(table), count
+        )
+    return count
+
+
+def drop_expired_partitions(model):
+    """Удаляет секции, все строки которых истекли (верхняя граница не позже начала текущих суток UTC).
+
+    DROP TABLE секции не зависит от числа строк в ней и не оставляет мёртвых кортежей.
+    Истекшие строки секции DEFAULT удаляются построчно. Возвращает имена удалённых секций.
+    """
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    today = _utc_day(timezone.now())
+
+    dropped = []
+    with connection.cursor() as cursor:
+        for day, name in sorted(_existing_partitions(table).items()):
+            if day < today:
+                cursor.execute(f'DROP TABLE IF EXISTS {quote(name)}')
+                dropped.append(name)
+        cursor.execute(
+            f'DELETE FROM {quote(_default_partition_name(table))} WHERE {quote("expired_at")} <= %s',
+            [timezone.now()]
+        )
+    return dropped
+
+
+def convert_to_partitioned(model, days_ahead=PARTITION_DAYS_AHEAD):
+    """Переводит таблицу модели в секционированную по expired_at (RANGE, по суткам).
+
+    Таблица пересоздаётся в одной транзакции: живые строки копируются, истекшие отбрасываются.
+    Первичный ключ становится (id, expired_at), уникальность token_hash - UNIQUE (token_hash,
+    expired_at): ограничение секционированной таблицы обязано включать ключ секционирования
+    (модели поэтому не объявляют token_hash уникальным). Последующие миграции этих таблиц
+    нужно проверять вручную.
+    """
+    quote = connection.ops.quote_name
+    table = model._meta.db_table
+    legacy = f'{table}_legacy'
+    sequence = f'{table}_pid_seq'
+    now = timezone.now()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}')
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} (LIKE {quote(legacy)} INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE ({quote("expired_at")})'
+        )
+
+        pk = model._meta.pk.column
+        cursor.execute(f'CREATE SEQUENCE {quote(sequence)} OWNED BY {quote(table)}.{quote(pk)}')
+        cursor.execute(
+            f"SELECT setval(%s, COALESCE((SELECT MAX({quote(pk)}) FROM {quote(legacy)}), 0) + 1, false)",
+            [sequence]
+        )
+        cursor.execute(f"ALTER TABLE {quote(table)} ALTER COLUMN {quote(pk)} SET DEFAULT nextval('{sequence}')")
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY ({quote(pk)}, {quote("expired_at")})')
+
+        for field in model._meta.concrete_fields:
+            if field.primary_key or field.name == 'expired_at':
+                continue
+            if field.name == 'token_hash':
+                cursor.execute(
+                    f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f"{table}_token_hash_puniq")} '
+                    f'UNIQUE ({quote(field.column)}, {quote("expired_at")})'
+                )
+            elif field.db_index or field.unique:
+                cursor.execute(
+                    f'CREATE INDEX {quote(f"{table}_{field.column}_pidx")} ON {quote(table)} ({quote(field.column)})'
+                )
+            if field.remote_field:
+                cursor.execute(
+                    f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f"{table}_{field.column}_pfk")} '
+                    f'FOREIGN KEY ({quote(field.column)}) '
+                    f'REFERENCES {quote(field.related_model._meta.db_table)} ({quote(field.target_field.column)}) '
+                    f'DEFERRABLE INITIALLY DEFERRED'
+                )
+
+        cursor.execute(f'SELECT MAX({quote("expired_at")}) FROM {quote(legacy)}')
+        last_expired = cursor.fetchone()[0]
+        create_partitions(model, days_ahead, last_day=_utc_day(last_expired) if last_expired else None)
+
+        cursor.execute(
+            f'INSERT INTO {quote(table)} SELECT * FROM {quote(legacy)} WHERE {quote("expired_at")} > %s', [now]
+        )
+        cursor.execute(f'DROP TABLE {quote(legacy)}')
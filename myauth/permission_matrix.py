@@ -0,0 +1,193 @@
+import threading
+
+from django.core.cache import cache
+
+from myauth.models import Permission, Role, UserRole
+from myauth.shared_cache import is_shared_cache
+
+READ = 1
+WRITE = 2
+DELETE = 4
+
+ACTION_BITS = {
+    'read': READ,
+    'write': WRITE,
+    'delete': DELETE,
+}
+
+GENERATION_CACHE_KEY = 'myauth:permission_matrix:generation'
+USER_VERSION_CACHE_KEY = 'myauth:permission_matrix:user:{}'
+MAX_CACHED_USERS = 10000
+
+
+def permission_mask(can_read, can_write, can_delete):
+    """Собирает битовую маску из флагов модели Permission"""
+    return (READ if can_read else 0) | (WRITE if can_write else 0) | (DELETE if can_delete else 0)
+
+
+class PermissionMatrix:
+    """Скомпилированная в памяти процесса матрица прав role_id -> {resource_name: маска}
+    и кэш ролей пользователей.
+
+    Строки матрицы заполняются лениво: роли пользователя и все их разрешения
+    подгружаются одним JOIN-запросом при первой проверке.
+    Согласованность между воркерами поддерживается счётчиками в общем кэше:
+    изменение ролей, ресурсов или прав увеличивает общий счётчик поколений, и процессы,
+    увидевшие новое значение, сбрасывают свою копию; изменение ролей одного пользователя
+    увеличивает только его счётчик, и перечитываются только его роли.
+    Без общего кэша (см. myauth.shared_cache) копия сбрасывается на каждой проверке.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix = {}
+        self._user_roles = {}
+        self._role_names = None
+        self._generation = None
+
+    def _sync_generation(self, user_id=None):
+        """Сбрасывает локальные данные, если поколение в общем кэше изменилось.
+
+        Возвращает версию ролей пользователя user_id (одним запросом get_many вместе с поколением).
+        """
+        if not is_shared_cache():
+            self._reset(None)
+            return 0
+
+        user_key = USER_VERSION_CACHE_KEY.format(user_id)
+        keys = [GENERATION_CACHE_KEY, user_key] if user_id is not None else [GENERATION_CACHE_KEY]
+        values = cache.get_many(keys)
+        generation = values.get(GENERATION_CACHE_KEY, 0)
+        if generation != self._generation:
+            self._reset(generation)
+        return values.get(user_key, 0)
+
+    def _reset(self, generation):
+        with self._lock:
+            self._matrix = {}
+            self._user_roles = {}
+            self._role_names = None
+            self._generation = generation
+
+    def _cached_roles(self, user_id, version):
+        """Роли пользователя из локального кэша, если они загружены при текущей версии"""
+        cached = self._user_roles.get(user_id)
+        if cached is None or cached[1] != version:
+            return None
+        return cached[0]
+
+    def _load_user(self, user_id, version=0):
+        """Одним запросом (UserRole JOIN Permission JOIN Resource) загружает роли
+        пользователя и строки матрицы для этих ролей"""
+        rows = UserRole.objects.filter(user_id=user_id).values_list(
+            'role_id',
+            'role__permissions__resource__name',
+            'role__permissions__can_read',
+            'role__permissions__can_write',
+            'role__permissions__can_delete',
+        )
+
+        role_rows = {}
+        for role_id, resource_name, can_read, can_write, can_delete in rows:
+            resources = role_rows.setdefault(role_id, {})
+            if resource_name is not None:
+                resources[resource_name] = permission_mask(can_read, can_write, can_delete)
+
+        roles = frozenset(role_rows)
+        with self._lock:
+            self._matrix.update(role_rows)
+            if len(self._user_roles) >= MAX_CACHED_USERS:
+                self._user_roles = {}
+            self._user_roles[user_id] = (roles, version)
+        return roles
+
+    def _load_roles(self, role_ids):
+        """Одним запросом загружает строки матрицы для заданных ролей"""
+        role_rows = {role_id: {} for role_id in role_ids}
+        rows = Permission.objects.filter(role_id__in=role_ids).values_list(
+            'role_id', 'resource__name', 'can_read', 'can_write', 'can_delete'
+        )
+        for role_id, resource_name, can_read, can_write, can_delete in rows:
+            role_rows[role_id][resource_name] = permission_mask(can_read, can_write, can_delete)
+
+        with self._lock:
+            self._matrix.update(role_rows)
+
+    def _get_rows(self, user_id, role_ids=None, version=0):
+        """Возвращает строки матрицы для ролей пользователя, обращаясь к БД не более одного раза.
+
+        role_ids - роли из самодостаточного токена; если переданы, роли пользователя
+        не запрашиваются.
+        """
+        matrix = self._matrix
+        if role_ids is not None:
+            missing = [role_id for role_id in role_ids if role_id not in matrix]
+            if missing:
+                self._load_roles(missing)
+                matrix = self._matrix
+            roles = role_ids
+        else:
+            roles = self._cached_roles(user_id, version)
+            if roles is None or not all(role_id in matrix for role_id in roles):
+                roles = self._load_user(user_id, version)
+                matrix = self._matrix
+        return [matrix.get(role_id, {}) for role_id in roles]
+
+    def get_user_roles(self, user_id):
+        """Возвращает множество role_id пользователя (запрос к БД только при промахе)"""
+        version = self._sync_generation(user_id)
+        roles = self._cached_roles(user_id, version)
+        if roles is None:
+            roles = self._load_user(user_id, version)
+        return roles
+
+    def role_names(self, role_ids):
+        """Возвращает отсортированные имена ролей по их id"""
+        names = self._role_names
+        if names is None:
+            names = dict(Role.objects.values_list('id', 'name'))
+            with self._lock:
+                self._role_names = names
+        return sorted(names[role_id] for role_id in role_ids if role_id in names)
+
+    def check_many(self, user_id, checks, role_ids=None):
+        """Проверяет набор пар (resource_name, action) и возвращает словарь результатов"""
+        version = self._sync_generation(user_id if role_ids is None else None)
+        rows = self._get_rows(user_id, role_ids, version)
+
+        result = {}
+        for resource_name, action in checks:
+            bit = ACTION_BITS.get(action, 0)
+            result[(resource_name, action)] = any(row.get(resource_name, 0) & bit for row in rows)
+        return result
+
+    def invalidate(self):
+        """Сбрасывает всю матрицу в текущем процессе и уведомляет остальные воркеры"""
+        with self._lock:
+            self._matrix = {}
+            self._user_roles = {}
+            self._role_names = None
+        self._bump_generation()
+
+    def invalidate_user(self, user_id):
+        """Сбрасывает закэшированные роли одного пользователя во всех воркерах,
+        не трогая матрицу и роли остальных пользователей"""
+        with self._lock:
+            self._user_roles.pop(user_id, None)
+        key = USER_VERSION_CACHE_KEY.format(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, 1, timeout=None):
+                cache.incr(key)
+
+    def _bump_generation(self):
+        try:
+            generation = cache.incr(GENERATION_CACHE_KEY)
+        except ValueError:
+            cache.add(GENERATION_CACHE_KEY, 1, timeout=None)
+            generation = cache.get(GENERATION_CACHE_KEY, 0)
+        with self._lock:
+            self._generation = generation
+
+
+permission_matrix = PermissionMatrix()
@@ -0,0 +1,102 @@
+import logging
+import re
+
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger('myauth.query_budget')
+
+IN_LIST_RE = re.compile(r'IN \((?:(?:%s|\?), )*(?:%s|\?)\)')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+FINGERPRINTS_IN_REPORT = 5
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Запрос к представлению выполнил больше SQL-запросов, чем его query_budget"""
+
+
+def query_budget(budget):
+    """Декоратор для функций-представлений: максимальное число SQL-запросов на запрос.
+
+    Для классов-представлений задаётся атрибутом класса query_budget: числом
+    или словарём {HTTP-метод: число}.
+    """
+    def decorator(view_func):
+        view_func.query_budget = budget
+        return view_func
+    return decorator
+
+
+def get_query_budget(view, method=None):
+    """Бюджет представления: атрибут query_budget класса (view_class для as_view()) или функции"""
+    view_class = getattr(view, 'view_class', view)
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+def fingerprint(sql):
+    """Нормализует SQL: литералы заменяются на ?, списки IN (%s, ...) сворачиваются"""
+    sql = LITERAL_RE.sub('?', sql)
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+def budget_report(view_name, budget, sqls):
+    """Отчёт о превышении бюджета: число запросов и самые частые отпечатки SQL"""
+    fingerprints = Counter(fingerprint(sql) for sql in sqls).most_common(FINGERPRINTS_IN_REPORT)
+    return {
+        'view': view_name,
+        'budget': budget,
+        'queries': len(sqls),
+        'fingerprints': [{'sql': sql, 'count': count} for sql, count in fingerprints],
+    }
+
+
+def format_report(report):
+    details = '\n'.join(f"  {item['count']} x {item['sql']}" for item in report['fingerprints'])
+    return f"{report['view']}: {report['queries']} SQL-запросов при бюджете {report['budget']}\n{details}"
+
+
+def check_query_budget(view_name, budget, sqls):
+    """Сравнивает выполненные запросы с бюджетом представления.
+
+    В строгом режиме (QUERY_BUDGET_STRICT, по умолчанию выключен) бросает QueryBudgetExceeded,
+    иначе пишет предупреждение с самыми частыми отпечатками SQL в лог myauth.query_budget.
+    Строгий режим - только для тестов: проверка идёт после представления, когда его
+    записи уже закоммичены, и исключение лишь превратило бы выполненный запрос в 500.
+    """
+    if budget is None or len(sqls) <= budget:
+        return
+
+    report = budget_report(view_name, budget, sqls)
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(format_report(report))
+    logger.warning(
+        'Превышен бюджет SQL-запросов %s: %d > %d', view_name, len(sqls), budget, extra={'query_budget': report}
+    )
+
+
+@contextmanager
+def assert_query_budget(view, method='GET', exact=None, using=DEFAULT_DB_ALIAS):
+    """Тестовый помощник: запросы внутри блока не превышают query_budget представления view
+    для HTTP-метода method.
+
+    С exact число запросов закрепляется точно: и рост, и снижение требуют обновить тест
+    (и, при снижении, бюджет представления).
+    """
+    from django.test.utils import CaptureQueriesContext
+
+    budget = get_query_budget(view, method)
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+
+    sqls = [query['sql'] for query in context.captured_queries]
+    name = getattr(view, '__name__', str(view))
+    if exact is not None and len(sqls) != exact:
+        raise QueryBudgetExceeded(format_report(budget_report(name, exact, sqls)))
+    if budget is not None and len(sqls) > budget:
+        raise QueryBudgetExceeded(format_report(budget_report(name, budget, sqls)))
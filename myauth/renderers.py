@@ -0,0 +1,52 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+UTF8_CHARSETS = ('utf-8', 'utf8')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson, без orjson - стандартный рендерер DRF на json.
+
+    Вывод совпадает со стандартным компактным: UTF-8 без экранирования кириллицы
+    (UNICODE_JSON), даты и Decimal форматируются JSONEncoder DRF, \\u2028 и \\u2029
+    экранируются. Отступы (?indent=, Browsable API) и UNICODE_JSON = False
+    обрабатывает стандартный рендерер.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if orjson is None or self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser на orjson, без orjson или для тела не в UTF-8 - стандартный парсер DRF.
+
+    Как и стандартный в строгом режиме, отклоняет NaN и Infinity.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower() not in UTF8_CHARSETS:
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
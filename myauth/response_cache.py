@@ -0,0 +1,109 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from myauth.shared_cache import is_shared_cache
+
+RESPONSE_CACHE_ALIAS = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+RESPONSE_CACHE_STALE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_STALE_TIMEOUT', 30)
+PROFILE_VERSION_CACHE_KEY = 'myauth:profile_version:{}'
+PROFILE_GENERATION_CACHE_KEY = 'myauth:profile_version:generation'
+
+
+class ResponseCache:
+    """Кэш данных ответов read-представлений с защитой от stampede.
+
+    Запись хранится как (данные, свежа до) дольше своего timeout на stale_timeout:
+    устаревшую запись пересобирает один воркер, получивший блокировку через cache.add,
+    остальные в это время отдают устаревшие данные. При полном промахе воркеры без
+    блокировки ждут до wait секунд, пока запись появится. Нужны только get/set/add/delete,
+    поэтому подходит любой общий бэкенд кэша Django; с кэшем в памяти процесса ответы
+    не кэшируются (версии, сброшенные другим воркером, были бы не видны).
+    """
+    LOCK_KEY = '{}:lock'
+
+    def __init__(self, alias=RESPONSE_CACHE_ALIAS, timeout=RESPONSE_CACHE_TIMEOUT,
+                 stale_timeout=RESPONSE_CACHE_STALE_TIMEOUT, lock_timeout=5, wait=1.0, poll_interval=0.02):
+        self.alias = alias
+        self.timeout = timeout
+        self.stale_timeout = stale_timeout
+        self.lock_timeout = lock_timeout
+        self.wait = wait
+        self.poll_interval = poll_interval
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _rebuild(self, key, build, timeout):
+        try:
+            value = build()
+            self.cache.set(key, (value, time.time() + timeout), timeout + self.stale_timeout)
+            return value
+        finally:
+            self.cache.delete(self.LOCK_KEY.format(key))
+
+    def get_or_build(self, key, build, timeout=None):
+        """Возвращает данные из кэша или вызывает build() и кэширует результат"""
+        if not is_shared_cache(self.alias):
+            return build()
+
+        timeout = timeout or self.timeout
+        lock_key = self.LOCK_KEY.format(key)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until > time.time() or not self.cache.add(lock_key, 1, self.lock_timeout):
+                return value
+            return self._rebuild(key, build, timeout)
+
+        if self.cache.add(lock_key, 1, self.lock_timeout):
+            return self._rebuild(key, build, timeout)
+
+        deadline = time.monotonic() + self.wait
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            entry = self.cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return build()
+
+
+response_cache = ResponseCache()
+
+
+def _profile_version_timeout():
+    # версия нужна, пока живут записи с ней; после истечения новая версия даёт только промах
+    return response_cache.timeout + response_cache.stale_timeout
+
+
+def get_profile_version(user_id):
+    """Версия профиля пользователя для ключей кэша ответов: общее поколение профилей
+    (bump_all_profile_versions) и версия пользователя, читаются одним get_many"""
+    key = PROFILE_VERSION_CACHE_KEY.format(user_id)
+    values = response_cache.cache.get_many([PROFILE_GENERATION_CACHE_KEY, key])
+    version = values.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not response_cache.cache.add(key, version, timeout=_profile_version_timeout()):
+            version = response_cache.cache.get(key) or version
+    return f'{values.get(PROFILE_GENERATION_CACHE_KEY, 0)}-{version}'
+
+
+def bump_profile_version(user_id):
+    """Делает недействительными закэшированные ответы профиля пользователя"""
+    response_cache.cache.set(PROFILE_VERSION_CACHE_KEY.format(user_id), uuid.uuid4().hex, timeout=_profile_version_timeout())
+
+
+def bump_all_profile_versions():
+    """Делает недействительными закэшированные ответы профилей всех пользователей
+    (после массовых изменений в обход сигналов, например bulk_create)"""
+    try:
+        response_cache.cache.incr(PROFILE_GENERATION_CACHE_KEY)
+    except ValueError:
+        if not response_cache.cache.add(PROFILE_GENERATION_CACHE_KEY, 1, timeout=None):
+            response_cache.cache.incr(PROFILE_GENERATION_CACHE_KEY)
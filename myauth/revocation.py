@@ -0,0 +1,119 @@
+import threading
+import time
+
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from myauth.models import BlacklistedToken
+
+GENERATION_CACHE_KEY = 'myauth:revocation:generation'
+SYNC_INTERVAL_SECONDS = getattr(settings, 'JWT_REVOCATION_SYNC_INTERVAL', 5)
+# как часто сверяться со счётчиком поколений в общем кэше (не на каждый запрос)
+GENERATION_CHECK_INTERVAL_SECONDS = getattr(settings, 'JWT_REVOCATION_CHECK_INTERVAL', 1)
+# blacklisted_at ставится при вставке, а строка видна после коммита транзакции:
+# дельта перечитывает этот запас, чтобы не пропустить строки долгих транзакций
+SYNC_OVERLAP = timedelta(seconds=getattr(settings, 'JWT_REVOCATION_SYNC_OVERLAP', 300))
+
+
+class RevocationSet:
+    """Множество дайджестов отозванных и ещё не истёкших токенов в памяти процесса.
+
+    Заполняется целиком при старте воркера (TokenStore.warm_up()), затем дополняется
+    инкрементально: локально при logout и по курсору blacklisted_at, когда другой воркер
+    увеличил счётчик поколений в общем кэше (или истёк SYNC_INTERVAL_SECONDS).
+    Счётчик читается из кэша не чаще раза в GENERATION_CHECK_INTERVAL_SECONDS.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._cursor = None
+        self._generation = None
+        self._synced_at = 0.0
+        self._checked_at = 0.0
+
+    def _needs_check(self):
+        return self._cursor is None or time.monotonic() - self._checked_at >= GENERATION_CHECK_INTERVAL_SECONDS
+
+    def _is_stale(self, generation):
+        return (
+            self._cursor is None
+            or generation != self._generation
+            or time.monotonic() - self._synced_at > SYNC_INTERVAL_SECONDS
+        )
+
+    def _queryset(self, started_at):
+        """Все живые отозванные токены при первой загрузке, иначе - дельта по курсору blacklisted_at"""
+        queryset = BlacklistedToken.objects.filter(expired_at__gt=started_at)
+        if self._cursor is not None:
+            queryset = queryset.filter(blacklisted_at__gte=self._cursor - SYNC_OVERLAP)
+        return queryset.values_list('token_hash', 'expired_at')
+
+    def _apply(self, rows, started_at):
+        with self._lock:
+            for token_hash, expired_at in rows:
+                self._revoked[bytes(token_hash)] = expired_at
+            self._revoked = {
+                digest: expired_at for digest, expired_at in self._revoked.items()
+                if expired_at > started_at
+            }
+            self._cursor = started_at
+            self._synced_at = time.monotonic()
+
+    def refresh(self):
+        """Подтягивает отзывы, сделанные другими воркерами"""
+        if not self._needs_check():
+            return
+        generation = cache.get(GENERATION_CACHE_KEY, 0)
+        self._checked_at = time.monotonic()
+        if self._is_stale(generation):
+            self._generation = generation
+            started_at = timezone.now()
+            self._apply(list(self._queryset(started_at)), started_at)
+
+    async def arefresh(self):
+        """Асинхронная версия refresh() для ASGI-представлений"""
+        if not self._needs_check():
+            return
+        generation = await cache.aget(GENERATION_CACHE_KEY, 0)
+        self._checked_at = time.monotonic()
+        if self._is_stale(generation):
+            self._generation = generation
+            started_at = timezone.now()
+            self._apply([row async for row in self._queryset(started_at)], started_at)
+
+    def contains(self, token_hash):
+        """Проверка по локальному множеству без синхронизации"""
+        expired_at = self._revoked.get(token_hash)
+        return expired_at is not None and expired_at > timezone.now()
+
+    def might_be_revoked(self, token_hash):
+        """Возвращает False, если токен точно не отозван; True - нужна проверка в БД"""
+        self.refresh()
+        return self.contains(token_hash)
+
+    async def amight_be_revoked(self, token_hash):
+        await self.arefresh()
+        return self.contains(token_hash)
+
+    def add(self, token_hash, expired_at):
+        """Добавляет дайджест токена в локальное множество и уведомляет остальные воркеры"""
+        with self._lock:
+            self._revoked[token_hash] = expired_at
+        try:
+            cache.incr(GENERATION_CACHE_KEY)
+        except ValueError:
+            cache.add(GENERATION_CACHE_KEY, 1, timeout=None)
+
+    async def aadd(self, token_hash, expired_at):
+        """Асинхронная версия add(): счётчик поколений меняется без блокировки цикла событий"""
+        with self._lock:
+            self._revoked[token_hash] = expired_at
+        try:
+            await cache.aincr(GENERATION_CACHE_KEY)
+        except ValueError:
+            await cache.aadd(GENERATION_CACHE_KEY, 1, timeout=None)
+
+
+revocation_set = RevocationSet()
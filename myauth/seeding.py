@@ -0,0 +1,170 @@
+import hashlib
+import multiprocessing
+import random
+import uuid
+
+from datetime import timedelta
+
+from django.db import connections
+from django.utils import timezone
+
+from myauth.jwt_utils import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAY
+from myauth.models import User, Role, UserRole, Resource, Permission, RefreshToken, BlacklistedToken, Post
+
+SEED_EMAIL = 'seed{}@{}'
+SEED_ROLE = 'SeedRole{}'
+SEED_RESOURCE = 'SeedResource{}'
+SEED_POST = 'Seed post {}'
+BASE_ROLE = 'User'
+
+
+def _rng(seed, key):
+    """Генератор случайных чисел для пользователя или роли: данные зависят только от seed и key,
+    а не от разбиения на пачки, поэтому повторный запуск даёт те же строки"""
+    return random.Random(seed * 1_000_003 + key)
+
+
+def seed_roles_and_resources(roles, resources, permission_density, seed, batch_size):
+    """Создаёт роли SeedRole*, ресурсы SeedResource* и матрицу прав между ними.
+
+    Каждая роль получает права примерно на permission_density ресурсов: чтение всегда,
+    запись и удаление - реже. Возвращает id синтетических ролей.
+    """
+    Role.objects.bulk_create(
+        [Role(name=SEED_ROLE.format(number)) for number in range(roles)], ignore_conflicts=True, batch_size=batch_size
+    )
+    Resource.objects.bulk_create(
+        [Resource(name=SEED_RESOURCE.format(number)) for number in range(resources)],
+        ignore_conflicts=True, batch_size=batch_size
+    )
+
+    role_ids = list(
+        Role.objects.filter(name__in=[SEED_ROLE.format(number) for number in range(roles)])
+        .order_by('id').values_list('id', flat=True)
+    )
+    resource_ids = list(
+        Resource.objects.filter(name__in=[SEED_RESOURCE.format(number) for number in range(resources)])
+        .order_by('id').values_list('id', flat=True)
+    )
+
+    permissions = []
+    for role_id in role_ids:
+        rng = _rng(seed, -role_id)
+        for resource_id in resource_ids:
+            if rng.random() >= permission_density:
+                continue
+            permissions.append(Permission(
+                role_id=role_id,
+                resource_id=resource_id,
+                can_read=True,
+                can_write=rng.random() < 0.3,
+                can_delete=rng.random() < 0.1,
+            ))
+    Permission.objects.bulk_create(permissions, ignore_conflicts=True, batch_size=batch_size)
+    return role_ids
+
+
+def _new_rows(model, rows):
+    """Отбрасывает строки, token_hash которых уже есть в таблице (повторный запуск)"""
+    if not rows:
+        return rows
+    existing = {
+        bytes(token_hash)
+        for token_hash in model.objects.filter(token_hash__in=[row.token_hash for row in rows])
+        .values_list('token_hash', flat=True)
+    }
+    return [row for row in rows if row.token_hash not in existing]
+
+
+def seed_users_chunk(start, end, options):
+    """Создаёт пользователей с номерами [start, end), их роли и живые токены.
+
+    Все пользователи получают один заранее вычисленный хэш пароля. Токены - синтетические
+    дайджесты (не JWT), нужны для воспроизведения объёма таблиц. Возвращает число
+    созданных строк по таблицам.
+    """
+    seed = options['seed']
+    now = timezone.now()
+    emails = [SEED_EMAIL.format(number, options['domain']) for number in range(start, end)]
+
+    User.objects.bulk_create(
+        [
+            User(email=email, first_name='Seed', last_name=str(number), password=options['password_hash'])
+            for number, email in zip(range(start, end), emails)
+        ],
+        ignore_conflicts=True,
+        batch_size=options['batch_size'],
+    )
+    user_ids = dict(User.objects.filter(email__in=emails).values_list('email', 'id'))
+
+    user_roles, refresh_tokens, blacklisted_tokens = [], [], []
+    for number, email in zip(range(start, end), emails):
+        user_id = user_ids[email]
+        rng = _rng(seed, number)
+
+        if options['base_role_id']:
+            user_roles.append(UserRole(user_id=user_id, role_id=options['base_role_id']))
+        if options['role_ids']:
+            user_roles.append(UserRole(user_id=user_id, role_id=rng.choice(options['role_ids'])))
+
+        tokens = int(options['refresh_tokens']) + (rng.random() < options['refresh_tokens'] % 1)
+        family_id = uuid.UUID(int=rng.getrandbits(128))
+        for index in range(tokens):
+            refresh_tokens.append(RefreshToken(
+                user_id=user_id,
+                token_hash=hashlib.sha256(f'seed-refresh:{email}:{index}'.encode()).digest(),
+                family_id=family_id,
+                expired_at=now + timedelta(seconds=rng.uniform(60, REFRESH_TOKEN_EXPIRE_DAY * 86400)),
+            ))
+
+        if rng.random() < options['blacklisted']:
+            blacklisted_tokens.append(BlacklistedToken(
+                user_id=user_id,
+                token_hash=hashlib.sha256(f'seed-access:{email}'.encode()).digest(),
+                expired_at=now + timedelta(seconds=rng.uniform(60, ACCESS_TOKEN_EXPIRE_MINUTES * 60)),
+            ))
+
+    UserRole.objects.bulk_create(user_roles, ignore_conflicts=True, batch_size=options['batch_size'])
+    refresh_tokens = _new_rows(RefreshToken, refresh_tokens)
+    RefreshToken.objects.bulk_create(refresh_tokens, batch_size=options['batch_size'])
+    blacklisted_tokens = _new_rows(BlacklistedToken, blacklisted_tokens)
+    BlacklistedToken.objects.bulk_create(blacklisted_tokens, batch_size=options['batch_size'])
+
+    return {'users': end - start, 'refresh_tokens': len(refresh_tokens), 'blacklisted_tokens': len(blacklisted_tokens)}
+
+
+def seed_posts(posts, batch_size):
+    """Досоздаёт посты ленты до posts штук с созданием по минуте назад от текущего момента.
+
+    Генератор: после каждой пачки отдаёт число созданных постов.
+    """
+    existing = Post.objects.filter(title__startswith=SEED_POST.format('')).count()
+    now = timezone.now()
+    for start in range(existing, posts, batch_size):
+        end = min(start + batch_size, posts)
+        Post.objects.bulk_create([
+            Post(title=SEED_POST.format(number), content='Синтетический пост', created_at=now - timedelta(minutes=number))
+            for number in range(start, end)
+        ])
+        yield end - start
+
+
+def _seed_users_chunk_worker(task):
+    return seed_users_chunk(*task)
+
+
+def seed_users(users, chunk_size, options, workers=1):
+    """Создаёт пользователей пачками по chunk_size, при workers > 1 - в нескольких процессах.
+
+    Генератор: после каждой пачки отдаёт её счётчики.
+    """
+    tasks = [(start, min(start + chunk_size, users), options) for start in range(0, users, chunk_size)]
+    if workers <= 1:
+        for task in tasks:
+            yield seed_users_chunk(*task)
+        return
+
+    # дочерние процессы открывают собственные соединения с БД
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        yield from pool.imap_unordered(_seed_users_chunk_worker, tasks)
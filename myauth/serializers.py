@@ -1,7 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
-from django.contrib.auth.hashers import make_password
 
-from myauth.models import User
+from myauth.hashing import hash_password
+from myauth.models import User, Post
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -19,7 +20,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        validated_data['password'] = make_password(validated_data['password'])
+        validated_data['password'] = hash_password(validated_data['password'])
         user = User.objects.create(
             email=validated_data['email'],
             first_name=validated_data['first_name'],
@@ -40,6 +41,15 @@ class LogoutSerializer(serializers.Serializer):
     refresh_token = serializers.CharField()
 
 
+class TokenIntrospectionSerializer(serializers.Serializer):
+    """Сериализатор пакетной проверки токенов"""
+    tokens = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=getattr(settings, 'JWT_INTROSPECTION_MAX_TOKENS', 1000)
+    )
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор отображения информации о пользователе"""
     class Meta:
@@ -56,6 +66,14 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 
 
 
+class PostSerializer(serializers.ModelSerializer):
+    """Сериализатор поста новостной ленты"""
+    class Meta:
+        model = Post
+        fields = ['id', 'title', 'content', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+
 class RoleSerializer(serializers.Serializer):
     """Сериализатор ролей"""
     class Meta:
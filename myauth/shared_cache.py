@@ -0,0 +1,26 @@
+import functools
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# бэкенды, записи которых видит только процесс, их записавший
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+SINGLE_PROCESS = getattr(settings, 'MYAUTH_SINGLE_PROCESS', False)
+
+
+@functools.lru_cache(maxsize=None)
+def _is_process_local(alias):
+    return isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
+
+
+def is_shared_cache(alias='default'):
+    """Видят ли все воркеры одни и те же записи кэша alias.
+
+    Версии пользователей, поколения матрицы прав и состояние ленты согласуются между
+    воркерами только через общий кэш (Redis, Memcached). С кэшем в памяти процесса
+    вызывающий код обращается к БД. MYAUTH_SINGLE_PROCESS = True (тесты, runserver)
+    объявляет такой кэш общим: процесс единственный.
+    """
+    return SINGLE_PROCESS or not _is_process_local(alias)
@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from myauth.feed import bump_feed_version
+from myauth.models import User, Role, Resource, Permission, UserRole, Post
+from myauth.permission_matrix import permission_matrix
+from myauth.response_cache import bump_profile_version
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_permission_matrix(sender, **kwargs):
+    """Пересобирает матрицу прав после изменения ролей, ресурсов или разрешений"""
+    transaction.on_commit(permission_matrix.invalidate)
+
+
+@receiver(post_save, sender=UserRole)
+@receiver(post_delete, sender=UserRole)
+def invalidate_user_roles(sender, instance, **kwargs):
+    """Сбрасывает закэшированные роли пользователя после изменения UserRole"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: permission_matrix.invalidate_user(user_id))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_feed(sender, **kwargs):
+    """Меняет версию ленты (ETag, Last-Modified) после изменения постов"""
+    transaction.on_commit(bump_feed_version)
+
+
+@receiver(post_save, sender=User)
+def invalidate_profile(sender, instance, **kwargs):
+    """Сбрасывает закэшированные ответы профиля после сохранения пользователя"""
+    user_id = instance.id
+    transaction.on_commit(lambda: bump_profile_version(user_id))
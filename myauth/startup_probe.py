@@ -0,0 +1,77 @@
+"""Замер холодного старта воркера в отдельном процессе (вызывается командой bench_startup).
+
+python -m myauth.startup_probe --requests 2000 --path /.well-known/jwks.json
+с DJANGO_SETTINGS_MODULE нужного профиля. До замера импортируется только стандартная
+библиотека; результат печатается в stdout одной строкой JSON.
+"""
+import argparse
+import io
+import json
+import sys
+import time
+
+STARTED = time.perf_counter()
+
+
+def wsgi_environ(path, host):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'HTTP_HOST': host,
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+    }
+
+
+def call(application, path, host):
+    statuses = []
+    body = application(wsgi_environ(path, host), lambda status, headers, exc_info=None: statuses.append(status))
+    b''.join(body)
+    body.close()
+    return statuses[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--path', default='/.well-known/jwks.json')
+    parser.add_argument('--host', default='localhost')
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    setup_done = time.perf_counter()
+
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
+    application_done = time.perf_counter()
+
+    # первый запрос загружает URLconf и модули представлений
+    status = call(application, args.path, args.host)
+    first_request_done = time.perf_counter()
+
+    samples = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        call(application, args.path, args.host)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+
+    json.dump({
+        'setup_s': setup_done - STARTED,
+        'application_s': application_done - setup_done,
+        'first_request_s': first_request_done - application_done,
+        'ready_s': first_request_done - STARTED,
+        'request_p50_ms': samples[len(samples) // 2] * 1000 if samples else None,
+        'request_p99_ms': samples[min(len(samples) * 99 // 100, len(samples) - 1)] * 1000 if samples else None,
+        'status': status,
+        'modules': len(sys.modules),
+    }, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,874 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import jwt
+import threading
+import time
+import unittest
+import uuid
+
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from myauth import partitioning
+from myauth.feed import encode_cursor
+from myauth.hashing import PasswordHashingPool, PasswordHashingBusy
+from myauth.jwt_utils import (
+    create_jwt_tokens,
+    access_token_claims,
+    blacklist_token,
+    verify_jwt_token,
+    rotate_refresh_token
+)
+from myauth.keys import get_key_ring
+from myauth.models import User, Role, UserRole, Permission, RefreshToken, BlacklistedToken, Post
+from myauth.permission_matrix import permission_matrix, GENERATION_CACHE_KEY
+from myauth.query_budget import QueryBudgetExceeded, assert_query_budget
+from myauth.response_cache import ResponseCache
+from myauth.token_cache import DecodedTokenCache, decoded_token_cache
+from myauth.token_store import get_token_store, DatabaseTokenStore, CacheTokenStore, CONSUMED, REUSED, EXPIRED, MISSING
+from myauth.revocation import RevocationSet, GENERATION_CACHE_KEY as REVOCATION_GENERATION_CACHE_KEY
+from myauth.utils import has_permissions
+from myauth.views import LogoutView, UserProfileView, NewFeedView
+
+
+def digest(value):
+    return hashlib.sha256(value.encode('utf-8')).digest()
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'секционирование доступно только на PostgreSQL')
+class TokenPartitioningTests(TestCase):
+    """convert_to_partitioned и обслуживание секций на настоящем PostgreSQL"""
+    def setUp(self):
+        self.user = User.objects.create_user('partition@example.com', 'Иван', 'Иванов', 'password')
+        now = timezone.now()
+        RefreshToken.objects.create(user=self.user, token_hash=digest('live'), expired_at=now + datetime.timedelta(days=1))
+        RefreshToken.objects.create(user=self.user, token_hash=digest('expired'), expired_at=now - datetime.timedelta(days=1))
+        partitioning.convert_to_partitioned(RefreshToken, days_ahead=3)
+
+    def test_convert_keeps_live_rows(self):
+        self.assertTrue(partitioning.is_partitioned(RefreshToken))
+        self.assertTrue(RefreshToken.objects.filter(token_hash=digest('live')).exists())
+        self.assertFalse(RefreshToken.objects.filter(token_hash=digest('expired')).exists())
+
+    def test_token_hash_unique_with_expired_at(self):
+        row = RefreshToken.objects.get(token_hash=digest('live'))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            RefreshToken.objects.create(user=self.user, token_hash=row.token_hash, expired_at=row.expired_at)
+
+    def test_rows_beyond_partitions_land_in_default(self):
+        expired_at = timezone.now() + datetime.timedelta(days=30)
+        RefreshToken.objects.create(user=self.user, token_hash=digest('far'), expired_at=expired_at)
+
+        with self.assertLogs('myauth.partitioning', 'ERROR'):
+            self.assertEqual(partitioning.check_default_partition(RefreshToken), 1)
+
+        partitioning.create_partitions(RefreshToken, days_ahead=31)
+        self.assertEqual(partitioning.check_default_partition(RefreshToken), 0)
+        self.assertTrue(RefreshToken.objects.filter(token_hash=digest('far')).exists())
+
+
+class QueryBudgetTests(TestCase):
+    """Число SQL-запросов эндпоинтов не превышает их query_budget (при холодном кэше - тоже)"""
+    def setUp(self):
+        call_command('create_test_users', stdout=io.StringIO())
+        cache.clear()
+        permission_matrix.invalidate()
+        # холодный воркер: первая проверка отзыва загружает множество отозванных токенов
+        patcher = mock.patch('myauth.token_store.revocation_set', RevocationSet())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.get(email='user@mail.ru')
+        self.moderator = User.objects.get(email='mod@mail.ru')
+
+    # точное число запросов эндпоинтов при холодном воркере и холодном кэше
+    queries = {
+        'logout': 4, 'logout_used_token': 5,
+        'profile_get': 3, 'profile_put': 4, 'profile_delete': 5,
+        'feed_get': 4, 'feed_post': 4, 'feed_delete': 5,
+    }
+
+    def client_for(self, user):
+        tokens = create_jwt_tokens(user.id, access_token_claims(user.id))
+        # выдача токенов прогревает кэш версий: эндпоинты измеряются при холодном кэше
+        cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + tokens['access_token'])
+        return client, tokens
+
+    def test_logout(self):
+        client, tokens = self.client_for(self.user)
+        with assert_query_budget(LogoutView, 'POST', exact=self.queries['logout']):
+            response = client.post('/api/auth/logout/', {'refresh_token': tokens['refresh_token']}, format='json')
+        self.assertEqual(response.status_code, 204)
+
+    def test_logout_used_token(self):
+        _, tokens = self.client_for(self.user)
+        successor = rotate_refresh_token(tokens['refresh_token'], verify_jwt_token(tokens['refresh_token']))
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + successor['access_token'])
+        with assert_query_budget(LogoutView, 'POST', exact=self.queries['logout_used_token']):
+            response = client.post('/api/auth/logout/', {'refresh_token': tokens['refresh_token']}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_get(self):
+        client, _ = self.client_for(self.user)
+        with assert_query_budget(UserProfileView, 'GET', exact=self.queries['profile_get']):
+            response = client.get('/api/auth/user/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_put(self):
+        client, _ = self.client_for(self.user)
+        with assert_query_budget(UserProfileView, 'PUT', exact=self.queries['profile_put']):
+            response = client.put('/api/auth/user/', {'first_name': 'Пётр'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(id=self.user.id).first_name, 'Пётр')
+
+    def test_profile_delete(self):
+        client, _ = self.client_for(self.user)
+        with assert_query_budget(UserProfileView, 'DELETE', exact=self.queries['profile_delete']):
+            response = client.delete('/api/auth/user/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_feed_get(self):
+        client, _ = self.client_for(self.user)
+        with assert_query_budget(NewFeedView, 'GET', exact=self.queries['feed_get']):
+            response = client.get('/api/auth/feed/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_feed_post(self):
+        client, _ = self.client_for(self.moderator)
+        with assert_query_budget(NewFeedView, 'POST', exact=self.queries['feed_post']):
+            response = client.post('/api/auth/feed/', {'title': 'Заголовок', 'content': 'Текст'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_feed_delete(self):
+        post = Post.objects.create(author=self.moderator, title='Заголовок', content='Текст')
+        client, _ = self.client_for(self.moderator)
+        with assert_query_budget(NewFeedView, 'DELETE', exact=self.queries['feed_delete']):
+            response = client.delete(f'/api/auth/feed/{post.id}/')
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_strict_mode_raises(self):
+        client, _ = self.client_for(self.user)
+        with mock.patch.object(UserProfileView, 'query_budget', 0), self.assertRaises(QueryBudgetExceeded):
+            client.get('/api/auth/user/')
+
+    def test_default_mode_logs(self):
+        client, _ = self.client_for(self.user)
+        with mock.patch.object(UserProfileView, 'query_budget', 0), self.assertLogs('myauth.query_budget', 'WARNING'):
+            response = client.get('/api/auth/user/')
+        self.assertEqual(response.status_code, 200)
+
+
+class SelfContainedQueryBudgetTests(QueryBudgetTests):
+    """Те же эндпоинты с самодостаточными access токенами: версии пользователя читаются из БД
+    при промахе кэша, а профиль дополнительно загружает пользователя для ответа"""
+    queries = {
+        **QueryBudgetTests.queries,
+        'profile_get': 4, 'profile_put': 5, 'profile_delete': 6,
+    }
+
+    def setUp(self):
+        patcher = mock.patch('myauth.jwt_utils.SELF_CONTAINED_ACCESS_TOKENS', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+
+class PermissionMatrixTests(TestCase):
+    """Матрица прав: сброс после коммита, сброс ролей одного пользователя, один запрос при холодном кэше"""
+    def setUp(self):
+        call_command('create_test_users', stdout=io.StringIO())
+        cache.clear()
+        permission_matrix.invalidate()
+        self.user = User.objects.get(email='user@mail.ru')
+        self.moderator = User.objects.get(email='mod@mail.ru')
+
+    def can(self, user, resource_name, action):
+        return has_permissions(user, [(resource_name, action)])[(resource_name, action)]
+
+    def test_cold_cache_single_query(self):
+        checks = [('NewsFeed', action) for action in ('read', 'write', 'delete')]
+        with self.assertNumQueries(1):
+            allowed = has_permissions(self.moderator, checks)
+        self.assertEqual(allowed, {check: True for check in checks})
+        with self.assertNumQueries(0):
+            has_permissions(self.moderator, checks)
+
+    def test_permission_change_applies_after_commit(self):
+        self.assertFalse(self.can(self.user, 'NewsFeed', 'write'))
+        permission = Permission.objects.get(role__name='User', resource__name='NewsFeed')
+        with self.captureOnCommitCallbacks(execute=True):
+            permission.can_write = True
+            permission.save()
+            self.assertFalse(self.can(self.user, 'NewsFeed', 'write'))
+        self.assertTrue(self.can(self.user, 'NewsFeed', 'write'))
+
+    def test_role_change_applies_after_commit(self):
+        self.assertFalse(self.can(self.user, 'NewsFeed', 'delete'))
+        with self.captureOnCommitCallbacks(execute=True):
+            UserRole.objects.filter(user=self.user).delete()
+            UserRole.objects.create(user=self.user, role=Role.objects.get(name='Moderator'))
+        self.assertTrue(self.can(self.user, 'NewsFeed', 'delete'))
+
+    def test_role_change_keeps_other_users(self):
+        self.can(self.user, 'NewsFeed', 'write')
+        self.assertTrue(self.can(self.moderator, 'NewsFeed', 'write'))
+        generation = cache.get(GENERATION_CACHE_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserRole.objects.filter(user=self.user).delete()
+
+        self.assertEqual(cache.get(GENERATION_CACHE_KEY), generation)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.can(self.moderator, 'NewsFeed', 'write'))
+        with self.assertNumQueries(1):
+            self.assertFalse(self.can(self.user, 'NewsFeed', 'read'))
+
+
+class RevocationSetTests(TestCase):
+    """Множество отозванных токенов: загрузка при старте и инкрементальная синхронизация"""
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('revoked@example.com', 'Иван', 'Иванов', 'password')
+        self.expired_at = timezone.now() + datetime.timedelta(minutes=15)
+
+    def revoke(self, name, blacklisted_at=None):
+        row = BlacklistedToken.objects.create(user=self.user, token_hash=digest(name), expired_at=self.expired_at)
+        if blacklisted_at is not None:
+            BlacklistedToken.objects.filter(id=row.id).update(blacklisted_at=blacklisted_at)
+
+    def test_loaded_once_then_checked_by_interval(self):
+        self.revoke('revoked')
+        revocation_set = RevocationSet()
+        revocation_set.refresh()
+        self.assertTrue(revocation_set.contains(digest('revoked')))
+
+        with self.assertNumQueries(0), mock.patch('myauth.revocation.cache') as shared_cache:
+            self.assertFalse(revocation_set.might_be_revoked(digest('live')))
+        shared_cache.get.assert_not_called()
+
+    def test_delta_includes_rows_of_long_transactions(self):
+        revocation_set = RevocationSet()
+        revocation_set.refresh()
+
+        # строка закоммичена позже, чем получила blacklisted_at
+        self.revoke('late', blacklisted_at=timezone.now() - datetime.timedelta(seconds=60))
+        cache.set(REVOCATION_GENERATION_CACHE_KEY, 1)
+        revocation_set._checked_at = 0.0
+        revocation_set.refresh()
+        self.assertTrue(revocation_set.contains(digest('late')))
+
+
+class SelfContainedTokenTests(TestCase):
+    """Самодостаточные access токены отклоняются после отзыва роли и удаления пользователя"""
+    def setUp(self):
+        call_command('create_test_users', stdout=io.StringIO())
+        cache.clear()
+        permission_matrix.invalidate()
+        self.user = User.objects.get(email='user@mail.ru')
+        self.moderator = User.objects.get(email='mod@mail.ru')
+        patcher = mock.patch('myauth.jwt_utils.SELF_CONTAINED_ACCESS_TOKENS', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def client_with(self, access_token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + access_token)
+        return client
+
+    def test_role_revoke_rejects_token_until_refresh(self):
+        tokens = create_jwt_tokens(self.user.id, access_token_claims(self.user.id))
+        self.assertEqual(self.client_with(tokens['access_token']).get('/api/auth/user/').status_code, 200)
+
+        admin = self.client_with(create_jwt_tokens(self.moderator.id)['access_token'])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = admin.delete(f'/api/auth/user/{self.user.id}/roles/', {'role': 'User'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.client_with(tokens['access_token']).get('/api/auth/user/').status_code, 403)
+
+        response = APIClient().post('/api/auth/token/refresh/', {'refresh_token': tokens['refresh_token']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # новый токен принимается и несёт роли без отозванной
+        client = self.client_with(response.json()['access_token'])
+        self.assertEqual(client.get('/api/auth/feed/').status_code, 403)
+        self.assertEqual(client.get('/api/auth/user/').data, {'error': 'Нет прав на просмотр профиля!'})
+
+    def test_soft_delete_rejects_token(self):
+        tokens = create_jwt_tokens(self.user.id, access_token_claims(self.user.id))
+        client = self.client_with(tokens['access_token'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.delete('/api/auth/user/').status_code, 204)
+
+        self.assertEqual(client.get('/api/auth/user/').status_code, 403)
+        response = APIClient().post('/api/auth/token/refresh/', {'refresh_token': tokens['refresh_token']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class DecodedTokenCacheTests(TestCase):
+    """Кэш проверенных JWT: срок жизни записи, удаление при отзыве и метрики попаданий"""
+    def test_entry_expires_at_exp(self):
+        token_cache = DecodedTokenCache()
+        exp = int(time.time()) + 60
+        token_cache.set(digest('token'), {'user_id': 1, 'exp': exp})
+
+        with mock.patch('myauth.token_cache.time.time', return_value=exp - 1):
+            self.assertEqual(token_cache.get(digest('token')), {'user_id': 1, 'exp': exp})
+        with mock.patch('myauth.token_cache.time.time', return_value=exp):
+            self.assertIsNone(token_cache.get(digest('token')))
+        self.assertEqual(token_cache.stats(), {'size': 0, 'hits': 1, 'misses': 1})
+
+    def test_blacklist_evicts_entry(self):
+        user = User.objects.create_user('cached@example.com', 'Иван', 'Иванов', 'password')
+        access_token = create_jwt_tokens(user.id)['access_token']
+        payload = verify_jwt_token(access_token)
+        self.assertIsNotNone(decoded_token_cache.get(digest(access_token)))
+
+        expired_at = datetime.datetime.fromtimestamp(payload['exp'], tz=datetime.timezone.utc)
+        blacklist_token(user.id, access_token, expired_at)
+        self.assertIsNone(decoded_token_cache.get(digest(access_token)))
+
+    def test_hits_and_misses_exported(self):
+        counters = {'hit': mock.Mock(), 'miss': mock.Mock()}
+        token_cache = DecodedTokenCache()
+        token_cache.set(digest('token'), {'user_id': 1, 'exp': time.time() + 60})
+        with mock.patch.dict('myauth.token_cache.DECODED_TOKEN_CACHE', counters):
+            token_cache.get(digest('token'))
+            token_cache.get(digest('other'))
+        counters['hit'].inc.assert_called_once_with()
+        counters['miss'].inc.assert_called_once_with()
+
+
+class ReapTokensTests(TestCase):
+    """reap_tokens: удаление пачками, --max-runtime 0 и проверка аргументов"""
+    def setUp(self):
+        self.user = User.objects.create_user('reap@example.com', 'Иван', 'Иванов', 'password')
+        expired_at = timezone.now() - datetime.timedelta(days=1)
+        RefreshToken.objects.bulk_create(
+            RefreshToken(user=self.user, token_hash=digest(f'expired-{number}'), expired_at=expired_at)
+            for number in range(5)
+        )
+
+    def test_zero_max_runtime_deletes_one_batch(self):
+        call_command('reap_tokens', batch_size=2, max_runtime=0, stdout=io.StringIO())
+        self.assertEqual(RefreshToken.objects.count(), 3)
+
+    def test_deletes_all_batches(self):
+        call_command('reap_tokens', batch_size=2, stdout=io.StringIO())
+        self.assertEqual(RefreshToken.objects.count(), 0)
+
+    def test_rejects_invalid_arguments(self):
+        for options in ({'batch_size': 0}, {'batch_size': -1}, {'max_runtime': -1}):
+            with self.subTest(options=options), self.assertRaises(CommandError):
+                call_command('reap_tokens', stdout=io.StringIO(), **options)
+        self.assertEqual(RefreshToken.objects.count(), 5)
+
+
+class PasswordHashingPoolTests(TestCase):
+    """Пул хэширования паролей: 429 с Retry-After при заполненной очереди и метрики пула"""
+    def setUp(self):
+        User.objects.create_user('pool@example.com', 'Иван', 'Иванов', 'password')
+        self.pool = PasswordHashingPool(workers=1, queue_size=0, retry_after=3)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        patcher = mock.patch('myauth.hashing.password_pool', self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def occupy(self):
+        return self.pool.submit(self.release.wait)
+
+    def test_full_queue_returns_429(self):
+        self.occupy()
+        response = APIClient().post('/api/auth/login/', {'email': 'pool@example.com', 'password': 'password'}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3')
+
+    async def test_full_queue_returns_429_async(self):
+        self.occupy()
+        response = await AsyncClient().post(
+            '/api/auth/async/login/', {'email': 'pool@example.com', 'password': 'password'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3')
+
+    def test_metrics_fed_from_pool(self):
+        metrics = {
+            name: mock.Mock() for name in (
+                'PASSWORD_POOL_QUEUE_DEPTH', 'PASSWORD_POOL_RUNNING', 'PASSWORD_POOL_WAIT_SECONDS', 'PASSWORD_POOL_REJECTED'
+            )
+        }
+        with mock.patch.multiple('myauth.hashing', **metrics):
+            future = self.occupy()
+            with self.assertRaises(PasswordHashingBusy):
+                self.pool.submit(time.sleep, 0)
+            self.release.set()
+            future.result()
+
+        metrics['PASSWORD_POOL_QUEUE_DEPTH'].inc.assert_called_once_with()
+        metrics['PASSWORD_POOL_QUEUE_DEPTH'].dec.assert_called_once_with()
+        metrics['PASSWORD_POOL_RUNNING'].inc.assert_called_once_with()
+        metrics['PASSWORD_POOL_RUNNING'].dec.assert_called_once_with()
+        metrics['PASSWORD_POOL_WAIT_SECONDS'].observe.assert_called_once()
+        metrics['PASSWORD_POOL_REJECTED'].inc.assert_called_once_with()
+
+
+class TokenStoreContract:
+    """Общие тесты хранилищ токенов: подкласс задаёт make_store()"""
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+        self.user = User.objects.create_user('store@example.com', 'Иван', 'Иванов', 'password')
+        self.expired_at = timezone.now() + datetime.timedelta(days=1)
+
+    def test_issue_lookup_discard(self):
+        self.store.issue(self.user.id, digest('refresh'), self.expired_at)
+        self.assertEqual(self.store.lookup(digest('refresh')), (self.user.id, self.expired_at))
+        self.assertIsNone(self.store.lookup(digest('missing')))
+
+        self.assertTrue(self.store.discard(digest('refresh')))
+        self.assertIsNone(self.store.lookup(digest('refresh')))
+        self.assertFalse(self.store.discard(digest('refresh')))
+
+    def test_revoke(self):
+        self.assertFalse(self.store.is_revoked(digest('access')))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.store.revoke(self.user.id, digest('access'), self.expired_at)
+        self.assertTrue(self.store.is_revoked(digest('access')))
+        self.assertEqual(self.store.revoked_many([digest('access'), digest('live')]), {digest('access')})
+
+    def test_rotate(self):
+        family_id = uuid.uuid4()
+        self.store.issue(self.user.id, digest('old'), self.expired_at, family_id)
+
+        result = self.store.rotate(digest('old'), self.user.id, digest('new'), self.expired_at, family_id, b'pair')
+        self.assertEqual((result.status, result.user_id, result.family_id), (CONSUMED, self.user.id, family_id))
+        self.assertIsNotNone(self.store.lookup(digest('new')))
+
+        result = self.store.rotate(digest('old'), self.user.id, digest('other'), self.expired_at, family_id, b'other')
+        self.assertEqual((result.status, result.family_id, result.successor), (REUSED, family_id, b'pair'))
+        self.assertIsNotNone(result.used_at)
+        self.assertIsNone(self.store.lookup(digest('other')))
+
+        # использованный токен не удаляется logout: по нему распознаётся повторное предъявление
+        self.assertFalse(self.store.discard(digest('old')))
+        result = self.store.rotate(digest('old'), self.user.id, digest('other'), self.expired_at, family_id, b'other')
+        self.assertEqual(result.status, REUSED)
+
+        self.store.revoke_family(family_id)
+        self.assertIsNone(self.store.lookup(digest('new')))
+
+    def test_rotate_missing_and_expired(self):
+        result = self.store.rotate(digest('missing'), self.user.id, digest('new'), self.expired_at)
+        self.assertEqual(result.status, MISSING)
+
+        self.store.issue(self.user.id, digest('expired'), timezone.now() - datetime.timedelta(seconds=1))
+        result = self.store.rotate(digest('expired'), self.user.id, digest('new'), self.expired_at)
+        self.assertEqual(result.status, EXPIRED)
+        self.assertIsNone(self.store.lookup(digest('new')))
+
+    def test_purge(self):
+        self.store.issue(self.user.id, digest('live'), self.expired_at)
+        self.store.issue(self.user.id, digest('expired'), timezone.now() - datetime.timedelta(seconds=1))
+
+        self.assertIsInstance(self.store.purge(), dict)
+        self.assertIsNotNone(self.store.lookup(digest('live')))
+        expired = self.store.lookup(digest('expired'))
+        self.assertTrue(expired is None or expired.is_expired())
+
+    def test_active_many(self):
+        family_id = uuid.uuid4()
+        self.store.issue(self.user.id, digest('used'), self.expired_at)
+        self.store.rotate(digest('used'), self.user.id, digest('new'), self.expired_at)
+        self.store.issue(self.user.id, digest('live'), self.expired_at)
+        self.store.issue(self.user.id, digest('expired'), timezone.now() - datetime.timedelta(seconds=1))
+        self.store.issue(self.user.id, digest('family'), self.expired_at, family_id)
+        self.store.revoke_family(family_id)
+
+        token_hashes = [digest(name) for name in ('used', 'new', 'live', 'expired', 'family', 'missing')]
+        self.assertEqual(self.store.active_many(token_hashes), {digest('new'), digest('live')})
+
+    async def test_async(self):
+        await self.store.aissue(self.user.id, digest('refresh'), self.expired_at)
+        self.assertEqual(await self.store.alookup(digest('refresh')), (self.user.id, self.expired_at))
+
+        result = await self.store.arotate(digest('refresh'), self.user.id, digest('new'), self.expired_at)
+        self.assertEqual(result.status, CONSUMED)
+        self.assertTrue(await self.store.adiscard(digest('new')))
+        self.assertIsNone(await self.store.alookup(digest('new')))
+
+        self.assertFalse(await self.store.ais_revoked(digest('access')))
+        await self.store.arevoke(self.user.id, digest('access'), self.expired_at)
+        self.assertTrue(await self.store.ais_revoked(digest('access')))
+
+
+class DatabaseTokenStoreTests(TokenStoreContract, TestCase):
+    def make_store(self):
+        return DatabaseTokenStore()
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'myauth-tests'},
+    'tokens': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'myauth-tests-tokens'},
+})
+class CacheTokenStoreTests(TokenStoreContract, TestCase):
+    def make_store(self):
+        return CacheTokenStore('tokens')
+
+    def tearDown(self):
+        self.store.cache.clear()
+
+
+class RefreshRotationFlow:
+    """Ротация, повторное предъявление и logout через API поверх хранилища make_store().
+
+    TransactionTestCase: записи об отзыве публикуются в on_commit, как в рабочем режиме.
+    """
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+        for module in ('myauth.jwt_utils', 'myauth.views', 'myauth.async_views'):
+            patcher = mock.patch(f'{module}.get_token_store', return_value=self.store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        cache.clear()
+        permission_matrix.invalidate()
+        call_command('create_test_users', stdout=io.StringIO())
+        self.user = User.objects.get(email='user@mail.ru')
+        self.tokens = create_jwt_tokens(self.user.id)
+        self.client = APIClient()
+
+    def refresh(self, refresh_token):
+        return self.client.post('/api/auth/token/refresh/', {'refresh_token': refresh_token}, format='json')
+
+    def profile(self, access_token):
+        return self.client.get('/api/auth/user/', HTTP_AUTHORIZATION='Bearer ' + access_token)
+
+    def test_replay_in_grace_window(self):
+        rotated = self.refresh(self.tokens['refresh_token'])
+        self.assertEqual(rotated.status_code, 200)
+
+        replayed = self.refresh(self.tokens['refresh_token'])
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed.json(), rotated.json())
+        self.assertEqual(self.profile(rotated.json()['access_token']).status_code, 200)
+        self.assertEqual(self.refresh(rotated.json()['refresh_token']).status_code, 200)
+
+    def test_reuse_after_grace_window_revokes_family(self):
+        other_session = create_jwt_tokens(self.user.id)
+        successor = self.refresh(self.tokens['refresh_token']).json()
+
+        with mock.patch('myauth.jwt_utils.REFRESH_ROTATION_GRACE_SECONDS', 0):
+            self.assertEqual(self.refresh(self.tokens['refresh_token']).status_code, 401)
+
+        self.assertEqual(self.refresh(successor['refresh_token']).status_code, 401)
+        self.assertEqual(self.profile(successor['access_token']).status_code, 403)
+        self.assertEqual(self.profile(self.tokens['access_token']).status_code, 403)
+        # остальные сессии пользователя не затронуты
+        self.assertEqual(self.profile(other_session['access_token']).status_code, 200)
+        self.assertEqual(self.refresh(other_session['refresh_token']).status_code, 200)
+
+    def test_logout_with_used_token(self):
+        successor = self.refresh(self.tokens['refresh_token']).json()
+
+        response = self.client.post(
+            '/api/auth/logout/', {'refresh_token': self.tokens['refresh_token']}, format='json',
+            HTTP_AUTHORIZATION='Bearer ' + successor['access_token']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(successor['refresh_token']).status_code, 401)
+        self.assertEqual(self.profile(successor['access_token']).status_code, 403)
+
+    async def test_async_logout_with_used_token(self):
+        response = await AsyncClient().post(
+            '/api/auth/async/token/refresh/', {'refresh_token': self.tokens['refresh_token']},
+            content_type='application/json'
+        )
+        successor = response.json()
+
+        response = await AsyncClient().post(
+            '/api/auth/async/logout/', {'refresh_token': self.tokens['refresh_token']},
+            content_type='application/json', headers={'Authorization': 'Bearer ' + successor['access_token']}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = await AsyncClient().post(
+            '/api/auth/async/token/refresh/', {'refresh_token': successor['refresh_token']},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout(self):
+        response = self.client.post(
+            '/api/auth/logout/', {'refresh_token': self.tokens['refresh_token']}, format='json',
+            HTTP_AUTHORIZATION='Bearer ' + self.tokens['access_token']
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.refresh(self.tokens['refresh_token']).status_code, 401)
+        self.assertEqual(self.profile(self.tokens['access_token']).status_code, 403)
+
+
+class DatabaseRefreshRotationTests(RefreshRotationFlow, TransactionTestCase):
+    def make_store(self):
+        return DatabaseTokenStore()
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'myauth-tests'},
+    'tokens': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'myauth-tests-tokens'},
+})
+class CacheRefreshRotationTests(RefreshRotationFlow, TransactionTestCase):
+    def make_store(self):
+        return CacheTokenStore('tokens')
+
+    def tearDown(self):
+        self.store.cache.clear()
+
+
+class FeedTests(TestCase):
+    """Курсорная пагинация ленты и условные запросы (ETag / Last-Modified)"""
+    def setUp(self):
+        call_command('create_test_users', stdout=io.StringIO())
+        cache.clear()
+        permission_matrix.invalidate()
+        self.moderator = User.objects.get(email='mod@mail.ru')
+        created_at = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            # у части постов одинаковое время создания: порядок внутри них задаёт id
+            self.posts = [
+                Post.objects.create(
+                    author=self.moderator, title=f'Пост {i}', content='Текст',
+                    created_at=created_at - datetime.timedelta(minutes=i // 2)
+                )
+                for i in range(7)
+            ]
+        tokens = create_jwt_tokens(User.objects.get(email='user@mail.ru').id)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + tokens['access_token'])
+
+    def feed(self, **params):
+        return self.client.get('/api/auth/feed/', params)
+
+    def test_keyset_pagination(self):
+        expected = [post.id for post in sorted(self.posts, key=lambda post: (post.created_at, post.id), reverse=True)]
+        ids, cursor = [], None
+        for _ in range(len(self.posts)):
+            response = self.feed(limit=3, **({'cursor': cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.json()['news'])
+            cursor = response.json()['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(ids, expected)
+
+    def test_page_after_last_post(self):
+        last = min(self.posts, key=lambda post: (post.created_at, post.id))
+        response = self.feed(cursor=encode_cursor(last.created_at, last.id))
+        self.assertEqual(response.json(), {'news': [], 'next_cursor': None})
+
+    def test_invalid_params(self):
+        self.assertEqual(self.feed(cursor='не-курсор').status_code, 400)
+        self.assertEqual(self.feed(limit='много').status_code, 400)
+
+    def test_not_modified(self):
+        response = self.feed()
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        response = self.client.get('/api/auth/feed/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get('/api/auth/feed/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # ETag зависит от страницы
+        self.assertEqual(self.client.get('/api/auth/feed/', {'limit': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_modified_after_write(self):
+        etag = self.feed()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.moderator, title='Новый пост', content='Текст')
+
+        response = self.client.get('/api/auth/feed/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['news'][0]['title'], 'Новый пост')
+
+    def test_not_modified_without_shared_cache(self):
+        with mock.patch('myauth.feed.is_shared_cache', return_value=False):
+            response = self.feed()
+            self.assertNotIn('Last-Modified', response)
+            etag = response['ETag']
+            self.assertEqual(self.client.get('/api/auth/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+            self.posts[0].delete()
+            self.assertEqual(self.client.get('/api/auth/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ResponseCacheTests(TestCase):
+    """Кэш ответов: повторное использование, защита от stampede и обход без общего кэша"""
+    def setUp(self):
+        cache.clear()
+        self.response_cache = ResponseCache(timeout=60, stale_timeout=30, wait=1.0, poll_interval=0.01)
+        self.build = mock.Mock(return_value={'data': 'новые'})
+
+    def hold_lock(self, key):
+        cache.add(ResponseCache.LOCK_KEY.format(key), 1, 5)
+
+    def test_hit(self):
+        self.assertEqual(self.response_cache.get_or_build('key', self.build), {'data': 'новые'})
+        self.assertEqual(self.response_cache.get_or_build('key', self.build), {'data': 'новые'})
+        self.build.assert_called_once()
+
+    def test_stale_served_while_rebuilding(self):
+        cache.set('key', ({'data': 'старые'}, time.time() - 1), 60)
+        self.hold_lock('key')
+        self.assertEqual(self.response_cache.get_or_build('key', self.build), {'data': 'старые'})
+        self.build.assert_not_called()
+
+    def test_stale_rebuilt_by_lock_holder(self):
+        cache.set('key', ({'data': 'старые'}, time.time() - 1), 60)
+        self.assertEqual(self.response_cache.get_or_build('key', self.build), {'data': 'новые'})
+        self.build.assert_called_once()
+        self.assertIsNone(cache.get(ResponseCache.LOCK_KEY.format('key')))
+
+    def test_miss_waits_for_builder(self):
+        self.hold_lock('key')
+        timer = threading.Timer(0.05, lambda: cache.set('key', ({'data': 'чужие'}, time.time() + 60), 60))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(self.response_cache.get_or_build('key', self.build), {'data': 'чужие'})
+        self.build.assert_not_called()
+
+    def test_miss_builds_after_wait(self):
+        self.hold_lock('key')
+        self.response_cache.wait = 0.05
+        self.assertEqual(self.response_cache.get_or_build('key', self.build), {'data': 'новые'})
+        self.build.assert_called_once()
+
+    def test_bypass_without_shared_cache(self):
+        with mock.patch('myauth.response_cache.is_shared_cache', return_value=False):
+            self.response_cache.get_or_build('key', self.build)
+            self.response_cache.get_or_build('key', self.build)
+        self.assertEqual(self.build.call_count, 2)
+        self.assertIsNone(cache.get('key'))
+
+    def test_feed_page_shared_between_roles(self):
+        call_command('create_test_users', stdout=io.StringIO())
+        permission_matrix.invalidate()
+        build_page = NewFeedView.build_page
+        with mock.patch.object(NewFeedView, 'build_page', autospec=True, side_effect=build_page) as build:
+            for email in ('user@mail.ru', 'mod@mail.ru'):
+                tokens = create_jwt_tokens(User.objects.get(email=email).id)
+                response = APIClient().get('/api/auth/feed/', HTTP_AUTHORIZATION='Bearer ' + tokens['access_token'])
+                self.assertEqual(response.status_code, 200)
+        build.assert_called_once()
+
+
+class GatewayVerifyTests(TestCase):
+    """/api/auth/verify принимает только access токены"""
+    def setUp(self):
+        call_command('create_test_users', stdout=io.StringIO())
+        self.user = User.objects.get(email='user@mail.ru')
+        self.tokens = create_jwt_tokens(self.user.id)
+
+    def verify(self, token):
+        return self.client.get('/api/auth/verify', HTTP_AUTHORIZATION='Bearer ' + token)
+
+    def test_access_token(self):
+        response = self.verify(self.tokens['access_token'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-User-Id'], str(self.user.id))
+        self.assertEqual(response['X-Roles'], 'User')
+
+    def test_refresh_token_rejected(self):
+        response = self.verify(self.tokens['refresh_token'])
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('X-User-Id', response)
+
+    async def test_refresh_token_rejected_async(self):
+        response = await AsyncClient().get('/api/auth/verify', headers={'Authorization': 'Bearer ' + self.tokens['refresh_token']})
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_token_rejected_by_api(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.tokens['refresh_token'])
+        self.assertEqual(client.get('/api/auth/user/').status_code, 403)
+
+
+class TokenIntrospectionTests(TestCase):
+    """Пакетная проверка токенов /api/auth/token/introspect/"""
+    def setUp(self):
+        call_command('create_test_users', stdout=io.StringIO())
+        cache.clear()
+        self.user = User.objects.get(email='user@mail.ru')
+        self.moderator = User.objects.get(email='mod@mail.ru')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + create_jwt_tokens(self.moderator.id)['access_token'])
+
+    def introspect(self, tokens):
+        response = self.client.post('/api/auth/token/introspect/', {'tokens': tokens}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_staff_only(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer ' + create_jwt_tokens(self.user.id)['access_token'])
+        response = client.post('/api/auth/token/introspect/', {'tokens': ['token']}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_results_in_input_order(self):
+        user_tokens = create_jwt_tokens(self.user.id)
+        moderator_tokens = create_jwt_tokens(self.moderator.id)
+        results = self.introspect([user_tokens['access_token'], 'garbage', moderator_tokens['refresh_token']])
+
+        self.assertEqual([result['user_id'] for result in results], [self.user.id, None, self.moderator.id])
+        self.assertEqual([result['active'] for result in results], [True, False, True])
+
+    def test_max_tokens(self):
+        limit = getattr(settings, 'JWT_INTROSPECTION_MAX_TOKENS', 1000)
+        response = self.client.post('/api/auth/token/introspect/', {'tokens': ['token'] * (limit + 1)}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_revoked_access_token(self):
+        access_token = create_jwt_tokens(self.user.id)['access_token']
+        payload = verify_jwt_token(access_token)
+        with self.captureOnCommitCallbacks(execute=True):
+            blacklist_token(self.user.id, access_token, datetime.datetime.fromtimestamp(payload['exp'], tz=datetime.timezone.utc))
+
+        [result] = self.introspect([access_token])
+        self.assertEqual((result['active'], result['revoked']), (False, True))
+
+    def test_used_and_revoked_refresh_tokens(self):
+        rotated = create_jwt_tokens(self.user.id)['refresh_token']
+        successor = rotate_refresh_token(rotated, verify_jwt_token(rotated))['refresh_token']
+        logged_out = create_jwt_tokens(self.user.id)['refresh_token']
+        get_token_store().discard(digest(logged_out))
+        family = create_jwt_tokens(self.user.id)['refresh_token']
+        get_token_store().revoke_family(uuid.UUID(verify_jwt_token(family)['fam']))
+
+        results = self.introspect([rotated, successor, logged_out, family])
+        self.assertEqual([result['active'] for result in results], [False, True, False, False])
+        self.assertEqual([result['revoked'] for result in results], [True, False, True, True])
+
+    def test_expired_and_foreign_tokens(self):
+        expired = get_key_ring().encode({'user_id': self.user.id, 'type': 'access', 'exp': int(time.time()) - 1})
+        foreign = jwt.encode({'user_id': self.user.id, 'type': 'access', 'exp': int(time.time()) + 60}, 'x' * 32, algorithm='HS256')
+
+        for result in self.introspect([expired, foreign]):
+            self.assertEqual(result, {'active': False, 'user_id': None, 'exp': None, 'revoked': False})
 
-# Create your tests here.
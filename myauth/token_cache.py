@@ -0,0 +1,70 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.conf import settings
+
+from myauth.metrics import DECODED_TOKEN_CACHE
+
+DECODE_CACHE_SIZE = getattr(settings, 'JWT_DECODE_CACHE_SIZE', 10000)
+
+
+class DecodedTokenCache:
+    """Ограниченный LRU-кэш проверенных полезных нагрузок JWT, ключ - дайджест токена.
+
+    Запись живёт до exp токена и удаляется при его отзыве. Попадания и промахи
+    считаются в метрике myauth_decoded_token_cache_requests_total{result} и в stats().
+    """
+    def __init__(self, max_size=DECODE_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token_hash):
+        """Возвращает копию закэшированной полезной нагрузки или None"""
+        with self._lock:
+            payload = self._entries.get(token_hash)
+            if payload is not None and payload['exp'] <= time.time():
+                del self._entries[token_hash]
+                payload = None
+            if payload is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(token_hash)
+                self.hits += 1
+
+        if payload is None:
+            DECODED_TOKEN_CACHE['miss'].inc()
+            return None
+        DECODED_TOKEN_CACHE['hit'].inc()
+        return dict(payload)
+
+    def set(self, token_hash, payload):
+        if self.max_size <= 0 or 'exp' not in payload:
+            return
+        with self._lock:
+            self._entries[token_hash] = dict(payload)
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, token_hash):
+        with self._lock:
+            self._entries.pop(token_hash, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Возвращает размер кэша и счётчики попаданий/промахов"""
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+decoded_token_cache = DecodedTokenCache()
@@ -0,0 +1,54 @@
+import time
+
+from django.utils import timezone
+
+from myauth.models import RefreshToken, BlacklistedToken
+from myauth.partitioning import is_partitioned
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def reap_model(model, batch_size=DEFAULT_BATCH_SIZE, sleep=0, deadline=None):
+    """Удаляет истекшие строки модели пачками по batch_size.
+
+    Каждая пачка - короткий DELETE по первичным ключам, найденным по индексу expired_at,
+    между пачками делается пауза sleep секунд. Срок deadline проверяется после пачки,
+    поэтому хотя бы одна пачка удаляется всегда. Возвращает число удалённых строк.
+    """
+    deleted_total = 0
+    now = timezone.now()
+
+    while True:
+        ids = list(
+            model.objects.filter(expired_at__lt=now).order_by('expired_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+
+        deleted, _ = model.objects.filter(id__in=ids).delete()
+        deleted_total += deleted
+
+        if len(ids) < batch_size:
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        if sleep:
+            time.sleep(sleep)
+
+    return deleted_total
+
+
+def reap_expired_tokens(batch_size=DEFAULT_BATCH_SIZE, sleep=0, max_runtime=None):
+    """Удаляет истекшие RefreshToken и BlacklistedToken, не дольше max_runtime секунд
+    (max_runtime = 0 - по одной пачке из каждой таблицы).
+
+    Секционированные таблицы пропускаются - их чистит partition_tokens удалением секций.
+    Возвращает словарь {имя модели: число удалённых строк}.
+    """
+    deadline = time.monotonic() + max_runtime if max_runtime is not None else None
+
+    return {
+        model.__name__: reap_model(model, batch_size=batch_size, sleep=sleep, deadline=deadline)
+        for model in (RefreshToken, BlacklistedToken)
+        if not is_partitioned(model)
+    }
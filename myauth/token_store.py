@@ -0,0 +1,415 @@
+import functools
+import logging
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from myauth.models import RefreshToken, BlacklistedToken
+from myauth.revocation import revocation_set
+
+TOKEN_STORE = getattr(settings, 'JWT_TOKEN_STORE', 'myauth.token_store.DatabaseTokenStore')
+TOKEN_STORE_CACHE = getattr(settings, 'JWT_TOKEN_STORE_CACHE', 'default')
+
+logger = logging.getLogger(__name__)
+
+
+class StoredToken(namedtuple('StoredToken', ['user_id', 'expired_at'])):
+    """Сохранённый refresh токен"""
+    __slots__ = ()
+
+    def is_expired(self):
+        return timezone.now() >= self.expired_at
+
+
+CONSUMED = 'consumed'
+REUSED = 'reused'
+EXPIRED = 'expired'
+MISSING = 'missing'
+
+
+class RotationResult(namedtuple(
+        'RotationResult', ['status', 'user_id', 'family_id', 'used_at', 'successor'], defaults=(None,))):
+    """Результат ротации refresh токена: status - CONSUMED, REUSED, EXPIRED или MISSING.
+
+    successor - непрозрачные данные, сохранённые при списании токена (для REUSED).
+    """
+    __slots__ = ()
+
+
+class TokenStore:
+    """Интерфейс хранилища refresh токенов и отозванных access токенов.
+
+    Токены передаются SHA-256 дайджестом (см. myauth.utils.token_digest).
+    """
+    def issue(self, user_id, token_hash, expired_at, family_id=None):
+        """Сохраняет выданный refresh токен"""
+        raise NotImplementedError
+
+    async def aissue(self, user_id, token_hash, expired_at, family_id=None):
+        raise NotImplementedError
+
+    def rotate(self, old_token_hash, user_id, token_hash, expired_at, family_id=None, successor=None):
+        """Атомарно помечает старый refresh токен использованным и сохраняет новый.
+
+        Новый токен сохраняется только если старый был найден, не истёк и не использовался;
+        иначе возвращается RotationResult со статусом REUSED, EXPIRED или MISSING.
+        successor (bytes) записывается вместе с отметкой об использовании и возвращается
+        в RotationResult.successor при повторном предъявлении.
+        """
+        raise NotImplementedError
+
+    async def arotate(self, old_token_hash, user_id, token_hash, expired_at, family_id=None, successor=None):
+        return await sync_to_async(self.rotate)(old_token_hash, user_id, token_hash, expired_at, family_id, successor)
+
+    def revoke_family(self, family_id):
+        """Отзывает все refresh токены цепочки ротации"""
+        raise NotImplementedError
+
+    def lookup(self, token_hash):
+        """Возвращает StoredToken или None, если refresh токен не найден"""
+        raise NotImplementedError
+
+    async def alookup(self, token_hash):
+        raise NotImplementedError
+
+    def active_many(self, token_hashes):
+        """Возвращает множество дайджестов refresh токенов, которые ещё можно обменять:
+        найдены, не использованы, не истекли и их цепочка не отозвана (пакетно, не по запросу на токен)"""
+        raise NotImplementedError
+
+    def discard(self, token_hash):
+        """Удаляет неиспользованный refresh токен, возвращает True если он был найден.
+
+        Использованный при ротации токен не удаляется: по нему распознаётся повторное предъявление.
+        """
+        raise NotImplementedError
+
+    async def adiscard(self, token_hash):
+        raise NotImplementedError
+
+    def revoke(self, user_id, token_hash, expired_at):
+        """Отзывает access токен до момента его истечения"""
+        raise NotImplementedError
+
+    async def arevoke(self, user_id, token_hash, expired_at):
+        raise NotImplementedError
+
+    def is_revoked(self, token_hash):
+        """Проверяет, отозван ли access токен"""
+        raise NotImplementedError
+
+    async def ais_revoked(self, token_hash):
+        raise NotImplementedError
+
+    def revoked_many(self, token_hashes):
+        """Возвращает множество отозванных дайджестов из переданных (один запрос к хранилищу)"""
+        raise NotImplementedError
+
+    async def arevoked_many(self, token_hashes):
+        return await sync_to_async(self.revoked_many)(token_hashes)
+
+    def purge(self, **options):
+        """Удаляет истекшие записи, возвращает {имя: число удалённых}"""
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Загружает данные, нужные для проверки токенов, при старте воркера"""
+
+
+class DatabaseTokenStore(TokenStore):
+    """Хранилище в таблицах RefreshToken и BlacklistedToken.
+
+    Проверка отзыва идёт через множество отозванных токенов в памяти процесса,
+    в БД уходят только положительные совпадения.
+    """
+    def issue(self, user_id, token_hash, expired_at, family_id=None):
+        RefreshToken.objects.create(user_id=user_id, token_hash=token_hash, expired_at=expired_at, family_id=family_id)
+
+    async def aissue(self, user_id, token_hash, expired_at, family_id=None):
+        await RefreshToken.objects.acreate(
+            user_id=user_id, token_hash=token_hash, expired_at=expired_at, family_id=family_id
+        )
+
+    def _prep(self, field_name, value):
+        return RefreshToken._meta.get_field(field_name).get_db_prep_value(value, connection)
+
+    def rotate(self, old_token_hash, user_id, token_hash, expired_at, family_id=None, successor=None):
+        now = timezone.now()
+        table = connection.ops.quote_name(RefreshToken._meta.db_table)
+        consume_sql = (
+            f'UPDATE {table} SET used_at = %s, successor = %s '
+            f'WHERE token_hash = %s AND used_at IS NULL AND expired_at > %s '
+            f'RETURNING user_id'
+        )
+        consume_params = [
+            self._prep('used_at', now), self._prep('successor', successor),
+            self._prep('token_hash', old_token_hash), self._prep('expired_at', now),
+        ]
+
+        if connection.vendor == 'postgresql':
+            # списание старого токена и вставка нового - один запрос
+            sql = (
+                f'WITH consumed AS ({consume_sql}) '
+                f'INSERT INTO {table} (user_id, token_hash, family_id, created_at, expired_at) '
+                f'SELECT user_id, %s, %s, %s, %s FROM consumed '
+                f'RETURNING user_id'
+            )
+            params = consume_params + [
+                self._prep('token_hash', token_hash), self._prep('family_id', family_id),
+                self._prep('created_at', now), self._prep('expired_at', expired_at),
+            ]
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+        else:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(consume_sql, consume_params)
+                    row = cursor.fetchone()
+                if row:
+                    RefreshToken.objects.create(
+                        user_id=row[0], token_hash=token_hash, expired_at=expired_at, family_id=family_id
+                    )
+
+        if row:
+            return RotationResult(CONSUMED, row[0], family_id, now)
+
+        existing = RefreshToken.objects.filter(token_hash=old_token_hash).values_list(
+            'user_id', 'family_id', 'used_at', 'expired_at', 'successor'
+        ).first()
+        if existing is None:
+            return RotationResult(MISSING, None, None, None)
+
+        existing_user_id, existing_family_id, used_at, existing_expired_at, existing_successor = existing
+        if existing_expired_at <= now:
+            return RotationResult(EXPIRED, existing_user_id, existing_family_id, used_at)
+        return RotationResult(
+            REUSED, existing_user_id, existing_family_id, used_at,
+            bytes(existing_successor) if existing_successor is not None else None
+        )
+
+    def revoke_family(self, family_id):
+        if family_id is not None:
+            RefreshToken.objects.filter(family_id=family_id).delete()
+
+    def lookup(self, token_hash):
+        row = RefreshToken.objects.filter(token_hash=token_hash).values_list('user_id', 'expired_at').first()
+        return StoredToken(*row) if row else None
+
+    async def alookup(self, token_hash):
+        row = await RefreshToken.objects.filter(token_hash=token_hash).values_list('user_id', 'expired_at').afirst()
+        return StoredToken(*row) if row else None
+
+    def active_many(self, token_hashes):
+        rows = RefreshToken.objects.filter(
+            token_hash__in=token_hashes, used_at__isnull=True, expired_at__gt=timezone.now()
+        ).values_list('token_hash', flat=True)
+        return {bytes(token_hash) for token_hash in rows}
+
+    def discard(self, token_hash):
+        deleted, _ = RefreshToken.objects.filter(token_hash=token_hash, used_at__isnull=True).delete()
+        return deleted > 0
+
+    async def adiscard(self, token_hash):
+        deleted, _ = await RefreshToken.objects.filter(token_hash=token_hash, used_at__isnull=True).adelete()
+        return deleted > 0
+
+    def revoke(self, user_id, token_hash, expired_at):
+        BlacklistedToken.objects.create(user_id=user_id, token_hash=token_hash, expired_at=expired_at)
+        transaction.on_commit(lambda: revocation_set.add(token_hash, expired_at))
+
+    async def arevoke(self, user_id, token_hash, expired_at):
+        await BlacklistedToken.objects.acreate(user_id=user_id, token_hash=token_hash, expired_at=expired_at)
+        await revocation_set.aadd(token_hash, expired_at)
+
+    def is_revoked(self, token_hash):
+        if not revocation_set.might_be_revoked(token_hash):
+            return False
+        return BlacklistedToken.objects.filter(token_hash=token_hash, expired_at__gt=timezone.now()).exists()
+
+    async def ais_revoked(self, token_hash):
+        if not await revocation_set.amight_be_revoked(token_hash):
+            return False
+        return await BlacklistedToken.objects.filter(token_hash=token_hash, expired_at__gt=timezone.now()).aexists()
+
+    def _revoked_rows(self, candidates):
+        return BlacklistedToken.objects.filter(
+            token_hash__in=candidates, expired_at__gt=timezone.now()
+        ).values_list('token_hash', flat=True)
+
+    def revoked_many(self, token_hashes):
+        revocation_set.refresh()
+        candidates = [token_hash for token_hash in token_hashes if revocation_set.contains(token_hash)]
+        if not candidates:
+            return set()
+        return {bytes(token_hash) for token_hash in self._revoked_rows(candidates)}
+
+    async def arevoked_many(self, token_hashes):
+        await revocation_set.arefresh()
+        candidates = [token_hash for token_hash in token_hashes if revocation_set.contains(token_hash)]
+        if not candidates:
+            return set()
+        return {bytes(token_hash) async for token_hash in self._revoked_rows(candidates)}
+
+    def purge(self, **options):
+        from myauth.token_reaper import reap_expired_tokens
+        return reap_expired_tokens(**options)
+
+    def warm_up(self):
+        revocation_set.refresh()
+
+
+class CacheTokenStore(TokenStore):
+    """Хранилище в кэше Django (JWT_TOKEN_STORE_CACHE), TTL записи равен сроку жизни токена.
+
+    Подходит для любого бэкенда кэша с общим доступом (Redis, Memcached);
+    с LocMemCache - для тестов и одиночного процесса.
+    """
+    REFRESH_KEY = 'myauth:refresh:{}'
+    USED_KEY = 'myauth:refresh-used:{}'
+    FAMILY_REVOKED_KEY = 'myauth:family-revoked:{}'
+    REVOKED_KEY = 'myauth:revoked:{}'
+
+    def __init__(self, alias=TOKEN_STORE_CACHE):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _ttl(self, expired_at):
+        return max(int((expired_at - timezone.now()).total_seconds()), 1)
+
+    def issue(self, user_id, token_hash, expired_at, family_id=None):
+        self.cache.set(
+            self.REFRESH_KEY.format(token_hash.hex()), (user_id, expired_at, family_id), self._ttl(expired_at)
+        )
+
+    async def aissue(self, user_id, token_hash, expired_at, family_id=None):
+        await self.cache.aset(
+            self.REFRESH_KEY.format(token_hash.hex()), (user_id, expired_at, family_id), self._ttl(expired_at)
+        )
+
+    def _get_refresh(self, token_hash):
+        """Возвращает (user_id, expired_at, family_id) живого токена или None"""
+        value = self.cache.get(self.REFRESH_KEY.format(token_hash.hex()))
+        if value is None:
+            return None
+        family_id = value[2]
+        if family_id is not None and self.cache.get(self.FAMILY_REVOKED_KEY.format(family_id)):
+            return None
+        return value
+
+    def lookup(self, token_hash):
+        value = self._get_refresh(token_hash)
+        return StoredToken(*value[:2]) if value else None
+
+    async def alookup(self, token_hash):
+        return await sync_to_async(self.lookup)(token_hash)
+
+    def rotate(self, old_token_hash, user_id, token_hash, expired_at, family_id=None, successor=None):
+        now = timezone.now()
+        value = self._get_refresh(old_token_hash)
+        if value is None:
+            return RotationResult(MISSING, None, None, None)
+
+        old_user_id, old_expired_at, old_family_id = value
+        if old_expired_at <= now:
+            return RotationResult(EXPIRED, old_user_id, old_family_id, None)
+
+        # cache.add атомарен: только первый потребитель токена получает True
+        used_key = self.USED_KEY.format(old_token_hash.hex())
+        if not self.cache.add(used_key, (now, successor), self._ttl(old_expired_at)):
+            used_at, used_successor = self.cache.get(used_key) or (None, None)
+            return RotationResult(REUSED, old_user_id, old_family_id, used_at, used_successor)
+
+        self.issue(old_user_id, token_hash, expired_at, family_id)
+        return RotationResult(CONSUMED, old_user_id, family_id, now)
+
+    def revoke_family(self, family_id):
+        from myauth.jwt_utils import REFRESH_TOKEN_EXPIRE_DAY
+        if family_id is not None:
+            self.cache.set(self.FAMILY_REVOKED_KEY.format(family_id), True, REFRESH_TOKEN_EXPIRE_DAY * 24 * 3600)
+
+    def active_many(self, token_hashes):
+        now = timezone.now()
+        keys = {}
+        for token_hash in token_hashes:
+            keys[self.REFRESH_KEY.format(token_hash.hex())] = token_hash
+            keys[self.USED_KEY.format(token_hash.hex())] = token_hash
+        values = self.cache.get_many(list(keys))
+
+        candidates = {}
+        for token_hash in token_hashes:
+            value = values.get(self.REFRESH_KEY.format(token_hash.hex()))
+            if value is None or self.USED_KEY.format(token_hash.hex()) in values or value[1] <= now:
+                continue
+            candidates[token_hash] = value[2]
+
+        family_keys = {self.FAMILY_REVOKED_KEY.format(family_id) for family_id in candidates.values() if family_id}
+        revoked_families = self.cache.get_many(list(family_keys)) if family_keys else {}
+        return {
+            token_hash for token_hash, family_id in candidates.items()
+            if not family_id or self.FAMILY_REVOKED_KEY.format(family_id) not in revoked_families
+        }
+
+    def discard(self, token_hash):
+        if self.cache.get(self.USED_KEY.format(token_hash.hex())) is not None:
+            return False
+        return self.cache.delete(self.REFRESH_KEY.format(token_hash.hex()))
+
+    async def adiscard(self, token_hash):
+        if await self.cache.aget(self.USED_KEY.format(token_hash.hex())) is not None:
+            return False
+        return await self.cache.adelete(self.REFRESH_KEY.format(token_hash.hex()))
+
+    def revoke(self, user_id, token_hash, expired_at):
+        self.cache.set(self.REVOKED_KEY.format(token_hash.hex()), user_id, self._ttl(expired_at))
+
+    async def arevoke(self, user_id, token_hash, expired_at):
+        await self.cache.aset(self.REVOKED_KEY.format(token_hash.hex()), user_id, self._ttl(expired_at))
+
+    def is_revoked(self, token_hash):
+        return self.cache.get(self.REVOKED_KEY.format(token_hash.hex())) is not None
+
+    async def ais_revoked(self, token_hash):
+        return await self.cache.aget(self.REVOKED_KEY.format(token_hash.hex())) is not None
+
+    def revoked_many(self, token_hashes):
+        keys = {self.REVOKED_KEY.format(token_hash.hex()): token_hash for token_hash in token_hashes}
+        return {keys[key] for key in self.cache.get_many(list(keys))}
+
+    async def arevoked_many(self, token_hashes):
+        keys = {self.REVOKED_KEY.format(token_hash.hex()): token_hash for token_hash in token_hashes}
+        return {keys[key] for key in await self.cache.aget_many(list(keys))}
+
+    def purge(self, **options):
+        # записи удаляет сам кэш по истечении TTL
+        return {}
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_store():
+    """Возвращает хранилище токенов, выбранное в настройке JWT_TOKEN_STORE"""
+    return import_string(TOKEN_STORE)()
+
+
+def warm_up_token_store():
+    """Прогревает хранилище токенов при старте воркера (effective_mobile.wsgi и asgi),
+    чтобы первый запрос не оплачивал полную выборку отозванных токенов.
+
+    Ошибка БД (например, до применения миграций) не мешает старту: данные
+    загрузятся при первой проверке токена.
+    """
+    try:
+        get_token_store().warm_up()
+    except DatabaseError:
+        logger.warning('Не удалось прогреть хранилище токенов при старте воркера', exc_info=True)
+    finally:
+        # соединение открыто вне цикла запроса - закрываем, чтобы его не унаследовал форк
+        connection.close()
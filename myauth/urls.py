@@ -1,15 +1,19 @@
 from django.urls import path
-
+from django.views.decorators.csrf import csrf_exempt
 
 from .views import (
     RegisterView,
     LoginView,
     RefreshTokenView,
     LogoutView,
+    LogoutAllView,
+    TokenIntrospectionView,
     UserProfileView,
     NewFeedView,
     UserRoleManagementView
 )
+from .async_views import AsyncLoginView, AsyncRefreshTokenView, AsyncLogoutView, AsyncLogoutAllView
+from .gateway import verify_view
 
 
 urlpatterns = [
@@ -17,6 +21,15 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('token/refresh/', RefreshTokenView.as_view(), name='token_refresh'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('logout/all/', LogoutAllView.as_view(), name='logout_all'),
+    path('token/introspect/', TokenIntrospectionView.as_view(), name='token_introspect'),
+
+    path('verify', csrf_exempt(verify_view), name='verify'),
+
+    path('async/login/', csrf_exempt(AsyncLoginView.as_view()), name='async_login'),
+    path('async/token/refresh/', csrf_exempt(AsyncRefreshTokenView.as_view()), name='async_token_refresh'),
+    path('async/logout/', csrf_exempt(AsyncLogoutView.as_view()), name='async_logout'),
+    path('async/logout/all/', csrf_exempt(AsyncLogoutAllView.as_view()), name='async_logout_all'),
 
     path('user/', UserProfileView.as_view(), name='user'),
     path('user/<int:user_id>/roles/', UserRoleManagementView.as_view(), name='user-role-management'),
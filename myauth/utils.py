@@ -1,26 +1,27 @@
-from myauth.models import Permission, Resource, UserRole
+import hashlib
 
+from myauth.metrics import observe_seconds, HAS_PERMISSION_SECONDS
+from myauth.permission_matrix import permission_matrix
 
+
+def token_digest(token):
+    """Возвращает SHA-256 дайджест токена (32 байта) - ключ хранения и поиска токенов в БД"""
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+def has_permissions(user, checks):
+    """Проверяет пакет пар (resource_name, action) для пользователя.
+
+    Возвращает словарь {(resource_name, action): bool}. При холодном кэше
+    выполняется один JOIN-запрос по UserRole, Permission и Resource,
+    при прогретом - ни одного. Для пользователя из самодостаточного токена
+    роли берутся из токена.
+    """
+    role_ids = getattr(user, 'token_role_ids', None)
+    return permission_matrix.check_many(user.id, checks, role_ids)
+
+
+@observe_seconds(HAS_PERMISSION_SECONDS)
 def has_permission(user, resource_name, action):
     """Проверяет, имеет ли пользователь разрешение на выполнение действия"""
-    try:
-        resource = Resource.objects.get(name=resource_name)
-    except Resource.DoesNotExist:
-        return False
-
-    user_roles = UserRole.objects.filter(user=user)
-
-    for user_role in user_roles:
-        role = user_role.role
-        try:
-            permission = Permission.objects.get(role=role, resource=resource)
-            if action == 'read' and permission.can_read:
-                return True
-            if action == 'write' and permission.can_write:
-                return True
-            if action == 'delete' and permission.can_delete:
-                return True
-        except Permission.DoesNotExist:
-            continue
-
-    return False
+    return has_permissions(user, [(resource_name, action)])[(resource_name, action)]
@@ -4,14 +4,18 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions, authentication
 
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET
 
 from myauth.models import (
-    RefreshToken,
-    BlacklistedToken,
     User,
     Role,
-    UserRole
+    UserRole,
+    Post
 )
 from myauth.serializers import (
     RegisterSerializer,
@@ -19,18 +23,29 @@ from myauth.serializers import (
     LogoutSerializer,
     UserSerializer,
     UserUpdateSerializer,
-    RoleSerializer
+    RoleSerializer,
+    TokenIntrospectionSerializer,
+    PostSerializer
 )
-from myauth.jwt_utils import create_jwt_token, create_jwt_tokens, decode_jwt_token, clean_user_tokens
-from myauth.utils import has_permission
-
-from drf_yasg.utils import swagger_auto_schema
-
-
-MOCK_POSTS = [
-    {"id": 1, "title": "Первая новость", "content": "Содержимое первой новости"},
-    {"id": 2, "title": "Вторая новость", "content": "Содержимое второй новости"},
-]
+from myauth.jwt_utils import (
+    create_jwt_tokens,
+    decode_jwt_token,
+    blacklist_token,
+    access_token_claims,
+    bump_auth_version,
+    bump_token_version,
+    introspect_tokens,
+    revoke_token_family,
+    rotate_refresh_token,
+    token_family,
+    RefreshTokenError
+)
+from myauth.utils import has_permission, token_digest
+from myauth.token_store import get_token_store
+from myauth.keys import get_key_ring
+from myauth.response_cache import response_cache, get_profile_version
+from myauth.feed import get_page, get_feed_state, InvalidCursor, FEED_PAGE_SIZE, FEED_MAX_PAGE_SIZE
+from myauth.api_docs import swagger_auto_schema
 
 
 class RegisterView(APIView):
@@ -59,9 +74,8 @@ class LoginView(APIView):
             password = serializer.validated_data['password']
             user = authenticate(request, email=email, password=password)
 
-            if user is not None and user.is_active:
-                clean_user_tokens(user.id)
-                token = create_jwt_tokens(user.id)
+            if user is not None:
+                token = create_jwt_tokens(user.id, access_token_claims(user.id), user.token_version)
                 return Response({"token": token})
             return Response(
                 {"error": "Неверные данные пользователя или пользователь удален!"},
@@ -71,7 +85,7 @@ class LoginView(APIView):
 
 
 class RefreshTokenView(APIView):
-    """Представление для создания нового access токена по refresh токену"""
+    """Представление для обмена refresh токена на новую пару токенов (с ротацией refresh токена)"""
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
@@ -84,21 +98,33 @@ class RefreshTokenView(APIView):
             return Response({'error': 'Недействительный refresh_token!'}, status=status.HTTP_401_UNAUTHORIZED)
 
         try:
-            token_object = RefreshToken.objects.get(token=refresh_token)
-        except RefreshToken.DoesNotExist:
-            return Response({'error': 'refresh_token не найден!'}, status=status.HTTP_401_UNAUTHORIZED)
+            tokens = rotate_refresh_token(refresh_token, payload)
+        except RefreshTokenError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        return Response(tokens, status=status.HTTP_200_OK)
 
-        if token_object.is_expired():
-            return Response({'error': 'refresh_token истек!'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        access_token = create_jwt_token(payload['user_id'])
+class TokenIntrospectionView(APIView):
+    """Представление для пакетной проверки токенов (валидность, user_id, exp, отзыв)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(request_body=TokenIntrospectionSerializer)
+    def post(self, request):
+        serializer = TokenIntrospectionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({'access_token': access_token}, status=status.HTTP_200_OK)
+        results = introspect_tokens(serializer.validated_data['tokens'])
+        return Response({'results': results}, status=status.HTTP_200_OK)
 
 
 class LogoutView(APIView):
     """Представление для logout пользователей, удаления refresh токена и помещения access токена в Blacklisted"""
     permission_classes = [permissions.IsAuthenticated]
+    # пользователь, синхронизация отозванных токенов, удаление refresh токена (в транзакции), запись в Blacklisted;
+    # для использованного при ротации токена - удаление цепочки (в транзакции) и запись её отзыва
+    query_budget = 7
 
     @swagger_auto_schema(request_body=LogoutSerializer)
     def post(self, request):
@@ -110,9 +136,12 @@ class LogoutView(APIView):
         if not payload or payload.get('type') != 'refresh':
             return Response({'error': 'Неверный refresh_token!'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        deleted, _ = RefreshToken.objects.filter(token=refresh_token).delete()
+        deleted = get_token_store().discard(token_digest(refresh_token))
 
-        if deleted == 0:
+        if not deleted:
+            # использованный при ротации токен - повторное предъявление: его преемники
+            # не должны пережить logout, поэтому отзывается вся цепочка
+            revoke_token_family(payload['user_id'], token_family(payload))
             return Response({'error': 'refresh_token уже отозван или не найден!'})
 
         auth_header = authentication.get_authorization_header(request).decode('utf-8')
@@ -127,8 +156,17 @@ class LogoutView(APIView):
 
         expired_at = datetime.datetime.fromtimestamp(access_payload['exp'], tz=datetime.timezone.utc)
 
-        BlacklistedToken.objects.create(user=request.user, token=access_token, expired_at=expired_at)
+        blacklist_token(request.user.id, access_token, expired_at)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LogoutAllView(APIView):
+    """Представление для выхода на всех устройствах: отзывает все выданные пользователю токены"""
+    permission_classes = [permissions.IsAuthenticated]
 
+    def post(self, request):
+        bump_token_version(request.user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -137,13 +175,18 @@ class LogoutView(APIView):
 class UserProfileView(APIView):
     """Представление для работы с пользователем"""
     permission_classes = [permissions.IsAuthenticated]
+    # пользователь, синхронизация отозванных токенов и матрица прав при холодном кэше
+    # (с самодостаточными токенами - версии пользователя и сам пользователь для ответа);
+    # PUT - сохранение профиля, DELETE - сохранение, bump_token_version и обновление кэша версий
+    query_budget = {'GET': 4, 'PUT': 5, 'DELETE': 6}
 
     def get(self, request):
         if not has_permission(request.user, "Profile", 'read'):
             return Response({'error': "Нет прав на просмотр профиля!"})
 
-        serializer = UserSerializer(request.user)
-        return Response(serializer.data)
+        user = request.user
+        key = f'myauth:response:profile:{user.id}:{get_profile_version(user.id)}'
+        return Response(response_cache.get_or_build(key, lambda: UserSerializer(user).data))
 
     @swagger_auto_schema(request_body=UserUpdateSerializer)
     def put(self, request):
@@ -165,41 +208,78 @@ class UserProfileView(APIView):
         user = request.user
         user.is_active = False
         user.save()
+        bump_token_version(user.id)
         return Response({'message': 'Аккаунт "удален"!'}, status=status.HTTP_204_NO_CONTENT)
 
 
 class NewFeedView(APIView):
-    """Представление для работы с новостной лентой"""
+    """Представление для работы с новостной лентой.
+
+    GET отдаёт страницу ленты (курсорная пагинация: ?cursor=...&limit=...) с ETag и Last-Modified
+    (Last-Modified - только при общем кэше);
+    условный запрос с совпадающим ETag получает 304 без запроса постов и сериализации.
+    """
     permission_classes = [permissions.IsAuthenticated]
+    # пользователь, синхронизация отозванных токенов и матрица прав при холодном кэше;
+    # GET - страница постов и состояние ленты без общего кэша, POST - вставка,
+    # DELETE - выборка и удаление по первичному ключу (на SQLite ещё BEGIN/COMMIT)
+    query_budget = {'GET': 5, 'POST': 4, 'DELETE': 7}
 
     def get(self, request):
-        if not has_permission(request.user, "NewsFeed", 'read'):
+        if not has_permission(request.user, 'NewsFeed', 'read'):
             return Response({'error': 'Нет прав на чтение новостей!'}, status=status.HTTP_403_FORBIDDEN)
-        return Response({'news': MOCK_POSTS})
 
+        cursor = request.query_params.get('cursor')
+        try:
+            limit = min(max(int(request.query_params.get('limit', FEED_PAGE_SIZE)), 1), FEED_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'limit должен быть числом!'}, status=status.HTTP_400_BAD_REQUEST)
+
+        version, last_modified = get_feed_state()
+        etag = quote_etag(f'{version}-{cursor or ""}-{limit}')
+        last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+        if response is None:
+            # страница не зависит от прав читателя: одна запись на всех; версия ленты меняется при записи
+            key = f'myauth:response:feed:{version}:{cursor or ""}:{limit}'
+            try:
+                data = response_cache.get_or_build(key, lambda: self.build_page(cursor, limit))
+            except InvalidCursor:
+                return Response({'error': 'Неверный cursor!'}, status=status.HTTP_400_BAD_REQUEST)
+            response = Response(data)
+
+        response['ETag'] = etag
+        if last_modified_ts is not None:
+            response['Last-Modified'] = http_date(last_modified_ts)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def build_page(self, cursor, limit):
+        posts, next_cursor = get_page(cursor, limit)
+        return {'news': PostSerializer(posts, many=True).data, 'next_cursor': next_cursor}
+
+    @swagger_auto_schema(request_body=PostSerializer)
     def post(self, request):
         if not has_permission(request.user, "NewsFeed", 'write'):
             return Response({'error': 'Нет прав на создание постов!'}, status=status.HTTP_403_FORBIDDEN)
 
-        new_post = {
-            'id': len(MOCK_POSTS) + 1,
-            'title': "Третья новость",
-            'content': "Содержимое первой новости"
-        }
-        MOCK_POSTS.append(new_post)
+        serializer = PostSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save(author_id=request.user.id)
 
-        return Response({'message': 'Пост создан!', 'post': new_post}, status=status.HTTP_201_CREATED)
+        return Response({'message': 'Пост создан!', 'post': serializer.data}, status=status.HTTP_201_CREATED)
 
     def delete(self, request, post_id):
         if not has_permission(request.user, "NewsFeed", 'delete'):
             return Response({'error': 'Нет прав на удаление постов!'}, status=status.HTTP_403_FORBIDDEN)
 
-        for i, post in enumerate(MOCK_POSTS):
-            if post['id'] == post_id:
-                del MOCK_POSTS[i]
-                return Response({'message': f'Пост {post_id} удален!'}, status=status.HTTP_204_NO_CONTENT)
+        deleted, _ = Post.objects.filter(pk=post_id).delete()
+        if not deleted:
+            return Response({'error': f'Пост {post_id} не найден!'}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response({'message': f'Пост {post_id} удален'}, status=status.HTTP_200_OK)
+        return Response({'message': f'Пост {post_id} удален!'}, status=status.HTTP_204_NO_CONTENT)
 
 
 class UserRoleManagementView(APIView):
@@ -219,6 +299,7 @@ class UserRoleManagementView(APIView):
 
         UserRole.objects.filter(user=user).delete()
         UserRole.objects.create(user=user, role=role)
+        bump_auth_version(user.id)
 
         return Response({'message': f'Роль {role_name} успешно присвоена пользователю {user.email}'}, status=status.HTTP_200_OK)
 
@@ -236,4 +317,19 @@ class UserRoleManagementView(APIView):
             return Response({'error': 'User или Role не найден'}, status=status.HTTP_404_NOT_FOUND)
 
         UserRole.objects.filter(user=user, role=role).delete()
+        bump_auth_version(user.id)
         return Response({'status': f'Роль {role_name} успешна удалена у пользователя {user.email}'}, status=status.HTTP_200_OK)
+
+
+@require_GET
+def jwks_view(request):
+    """Публичные ключи проверки JWT в формате JWKS для локальной проверки токенов другими сервисами"""
+    body, etag = get_key_ring().jwks_body
+
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = f"public, max-age={getattr(settings, 'JWT_JWKS_MAX_AGE', 300)}"
+    return response